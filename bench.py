@@ -0,0 +1,179 @@
+"""
+bench.py
+Benchmarks of the SimpleGoBoard primitives of a player.
+
+Each operation is timed on random positions of 7x7, 11x11, 15x15 and
+19x19 boards at several fill levels, the fraction of the points with a
+stone. The positions are played out at random, without a five in a row.
+An operation is repeated on POSITIONS positions in turn until at least
+the given seconds have passed. play_move_gomoku is timed together with
+the undo_move that restores the position.
+
+The results are printed as operations per second and written to a JSON
+file. With --baseline each result is compared with the same benchmark
+of an earlier results file, as written by another commit.
+Operations that call a method the board of the player does not have,
+such as undo_move on older boards, are skipped.
+
+Usage: python3 bench.py [--player DIR] [--sizes N ...] [--fills F ...]
+                        [--seconds S] [--output FILE] [--baseline FILE]
+"""
+import argparse
+import importlib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+"""
+Random positions per board size and fill level
+"""
+POSITIONS = 8
+
+SIZES = (7, 11, 15, 19)
+FILLS = (0.0, 0.25, 0.5, 0.75)
+
+def playUndo(board, point):
+    board.play_move_gomoku(point, board.current_player)
+    board.undo_move()
+
+"""
+(name, function, methods): each function takes a board and an empty
+point of it, and must leave the board as it was. methods are the board
+methods it calls.
+"""
+OPERATIONS = [
+    ('play_move_gomoku', playUndo, ('play_move_gomoku', 'undo_move')),
+    ('check_game_end_gomoku', lambda board, point: board.check_game_end_gomoku(),
+     ('check_game_end_gomoku',)),
+    ('get_empty_points', lambda board, point: board.get_empty_points(),
+     ('get_empty_points',)),
+    ('get_pattern_moves', lambda board, point: board.get_pattern_moves(),
+     ('get_pattern_moves',)),
+    ('list_solve_point', lambda board, point: board.list_solve_point(),
+     ('list_solve_point',)),
+    ('winDetection', lambda board, point: board.winDetection(),
+     ('winDetection',)),
+    ('get_heuristic_score', lambda board, point: board.get_heuristic_score(),
+     ('get_heuristic_score',)),
+    ('copy', lambda board, point: board.copy(), ('copy',)),
+]
+
+def randomPosition(boardClass, size, fill, rng):
+    """
+    A board of size with round(fill * size * size) stones, played in
+    turn at random points, and no five in a row. A move that makes a
+    five is taken back, or the board is started over on boards without
+    undo_move.
+    """
+    stones=round(fill * size * size)
+    while True:
+        board=boardClass(size)
+        played=0
+        points=board.get_empty_points()
+        rng.shuffle(points)
+        for point in points:
+            if played==stones:
+                return board
+            board.play_move_gomoku(point, board.current_player)
+            played+=1
+            if board.check_game_end_gomoku()[0]:
+                if not hasattr(board, 'undo_move'):
+                    break
+                board.undo_move()
+                played-=1
+        if played==stones:
+            return board
+
+def timeOperation(function, positions, seconds):
+    """
+    Operations per second of function on positions, a list of
+    (board, point), run on each in turn for at least seconds
+    """
+    count=0
+    start=time.perf_counter()
+    while True:
+        for board,point in positions:
+            function(board, point)
+        count+=len(positions)
+        elapsed=time.perf_counter()-start
+        if elapsed>=seconds:
+            return count / elapsed
+
+def commitId():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))
+                                       ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def runBenchmarks(boardClass, sizes=SIZES, fills=FILLS, seconds=0.2,
+                  seed=0, baseline=None):
+    """
+    Time every operation of OPERATIONS that boardClass has on each size
+    and fill level, print and return the list of results
+    """
+    rng=random.Random(seed)
+    results=[]
+    for size in sizes:
+        for fill in fills:
+            positions=[]
+            for _ in range(POSITIONS):
+                board=randomPosition(boardClass, size, fill, rng)
+                positions.append((board, rng.choice(board.get_empty_points())))
+            for name,function,methods in OPERATIONS:
+                if not all(hasattr(boardClass, m) for m in methods):
+                    continue
+                opsPerSec=timeOperation(function, positions, seconds)
+                result={'size': size, 'fill': fill, 'operation': name,
+                        'ops_per_sec': opsPerSec}
+                results.append(result)
+                line='{0}x{0} fill {1:>4.0%} {2:<22} {3:>12,.0f} ops/s'.format(
+                    size, fill, name, opsPerSec)
+                old=(baseline or {}).get((size, fill, name))
+                if old:
+                    line+='  {:.2f}x'.format(opsPerSec / old)
+                print(line)
+    return results
+
+def loadBaseline(path):
+    """
+    Operations per second of a results file, by (size, fill, operation)
+    """
+    with open(path) as f:
+        data=json.load(f)
+    return {(r['size'], r['fill'], r['operation']): r['ops_per_sec']
+            for r in data['results']}
+
+def main():
+    parser=argparse.ArgumentParser(description='Benchmarks of the board primitives')
+    parser.add_argument('--player', default='gomoku4',
+                        help='directory of the player whose simple_board is timed')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(SIZES))
+    parser.add_argument('--fills', type=float, nargs='+', default=list(FILLS))
+    parser.add_argument('--seconds', type=float, default=0.2,
+                        help='least time per benchmark')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--baseline', help='results file to compare with')
+    args=parser.parse_args()
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                    args.player))
+    boardClass=importlib.import_module('simple_board').SimpleGoBoard
+    baseline=loadBaseline(args.baseline) if args.baseline else None
+    results=runBenchmarks(boardClass, args.sizes, args.fills, args.seconds,
+                          args.seed, baseline)
+    with open(args.output, 'w') as f:
+        json.dump({'player': args.player, 'commit': commitId(),
+                   'python': platform.python_version(),
+                   'seconds': args.seconds, 'seed': args.seed,
+                   'results': results}, f, indent=1)
+    print('results written to', args.output)
+
+if __name__=='__main__':
+    main()
@@ -0,0 +1,218 @@
+"""
+bench_search.py
+Benchmarks of the search and the playouts of a player on a fixed
+corpus of positions, positions.txt.
+
+The alphabeta search is timed on every position with iterative
+deepening up to --depth plies, the search of alphabeta.solve, from an
+empty transposition table. Its nodes per second and time to solve are
+printed together with the move and the score found. The playouts of
+GomokuSimulationPlayer._do_playout are timed in the random and the
+rule_based policy, --playouts per position, with the random generators
+seeded so the playouts are the same from one run to the next.
+Players without the alphabeta search of gomoku4 only run the playouts.
+--prune-far drops the moves far from all stones from the search, see
+alphabeta.PRUNE_FAR_MOVES.
+
+The results are written to a JSON file. With --baseline the speeds are
+compared with an earlier results file, and the move, score and proof of
+every search must be the same as in it: a difference is reported and
+the exit status is 1, so a speed-up that changes the search is caught.
+The node counts are compared too, which shows the gain of a change to
+the move ordering, such as a run with --prune-far against one without.
+The playout results are printed for reference only, as an optimization
+may draw the random numbers in another order.
+
+Usage: python3 bench_search.py [--player DIR] [--positions FILE]
+                               [--depth D] [--prune-far]
+                               [--playouts N] [--seed S]
+                               [--output FILE] [--baseline FILE]
+"""
+import argparse
+import importlib
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+import numpy as np
+
+from bench import commitId
+
+"""
+Player module of each player directory, with its GomokuSimulationPlayer
+"""
+PLAYER_MODULES = {'gomoku4': 'Gomoku4', 'flat_mc_player': 'Gomoku3'}
+
+POLICIES = ('random', 'rule_based')
+
+def loadPositions(path):
+    """
+    List of (name, size, moves) of a corpus file: one position per line,
+    its name, the board size and the moves in GTP coordinates. Blank
+    lines and lines starting with # are skipped.
+    """
+    positions=[]
+    with open(path) as f:
+        for line in f:
+            fields=line.split()
+            if not fields or fields[0].startswith('#'):
+                continue
+            positions.append((fields[0], int(fields[1]), fields[2:]))
+    return positions
+
+def setupBoard(boardClass, size, moves):
+    """
+    A board of size with moves played in turn from black
+    """
+    from gtp_connection import move_to_coord
+    from board_util import coord_to_point
+    board=boardClass(size)
+    for move in moves:
+        row,col=move_to_coord(move, size)
+        board.play_move_gomoku(coord_to_point(row, col, size), board.current_player)
+    return board
+
+def formatMove(board, move):
+    from gtp_connection import format_point, point_to_coord
+    return format_point(point_to_coord(move, board.size)).lower()
+
+def formatScore(alphabeta, score):
+    if score==alphabeta.INFINITY:
+        return 'win'
+    if score==-alphabeta.INFINITY:
+        return 'loss'
+    return str(score)
+
+def timeSearch(alphabeta, board, depth):
+    """
+    Search board from an empty transposition table, return the result as
+    a dict of move, score, proven, depth, nodes, seconds and nodes/sec
+    """
+    alphabeta.reset_search_state()
+    start=time.perf_counter()
+    score,move,proven=alphabeta.iterative_deepening(board, None, depth)
+    seconds=time.perf_counter()-start
+    return {'move': formatMove(board, move), 'score': score,
+            'proven': proven, 'depth': alphabeta.depth,
+            'nodes': alphabeta.nodes, 'seconds': seconds,
+            'nodes_per_sec': alphabeta.nodes / seconds}
+
+def timePlayouts(player, board, count, seed):
+    """
+    Run count playouts from board with the generators seeded by seed,
+    return the result as a dict of the sum of the playout results,
+    seconds and playouts/sec
+    """
+    random.seed(seed)
+    np.random.seed(seed)
+    toplay=board.current_player
+    total=0.0
+    start=time.perf_counter()
+    for _ in range(count):
+        total+=player._do_playout(board, toplay)
+    seconds=time.perf_counter()-start
+    return {'total': total, 'seconds': seconds,
+            'playouts_per_sec': count / seconds}
+
+def runBenchmarks(playerDir, positions, depth=2, playouts=200, seed=0,
+                  baseline=None, pruneFar=False):
+    """
+    Time the search and the playouts of the player in playerDir on each
+    of positions, print and return (results, mismatches): the list of
+    results and the number of searches that differ from baseline
+    """
+    boardClass=importlib.import_module('simple_board').SimpleGoBoard
+    playerModule=importlib.import_module(PLAYER_MODULES[playerDir])
+    try:
+        alphabeta=importlib.import_module('alphabeta')
+    except ImportError:
+        alphabeta=None
+    if not hasattr(alphabeta, 'reset_search_state'):
+        alphabeta=None
+    else:
+        alphabeta.PRUNE_FAR_MOVES=pruneFar
+    baseline=baseline or {}
+    results=[]
+    mismatches=0
+    for name,size,moves in positions:
+        board=setupBoard(boardClass, size, moves)
+        if alphabeta is not None:
+            result=timeSearch(alphabeta, board, depth)
+            result.update(position=name, benchmark='search')
+            results.append(result)
+            line='{:<20} search     {:>4} {:>6} {:<6} {:>9,} nodes {:>8.3f}s {:>10,.0f} nodes/s'.format(
+                name, result['move'], formatScore(alphabeta, result['score']),
+                'proven' if result['proven'] else '', result['nodes'],
+                result['seconds'], result['nodes_per_sec'])
+            old=baseline.get((name, 'search'))
+            if old:
+                line+='  {:.2f}x, nodes {:.2f}x'.format(
+                    result['nodes_per_sec'] / old['nodes_per_sec'],
+                    result['nodes'] / max(old['nodes'], 1))
+                same=[result[k]==old[k] for k in ('move', 'score', 'proven')]
+                if not all(same):
+                    mismatches+=1
+                    line+='  CHANGED from {} {} {}'.format(
+                        old['move'], formatScore(alphabeta, old['score']),
+                        'proven' if old['proven'] else '')
+            print(line)
+        for policy in POLICIES:
+            player=playerModule.GomokuSimulationPlayer(playout_policy=policy)
+            result=timePlayouts(player, board, playouts, seed)
+            result.update(position=name, benchmark=policy)
+            results.append(result)
+            line='{:<20} {:<10} {:>11} {:>+6.0f} total {:>8.3f}s {:>10,.0f} playouts/s'.format(
+                name, policy, '', result['total'], result['seconds'],
+                result['playouts_per_sec'])
+            old=baseline.get((name, policy))
+            if old:
+                line+='  {:.2f}x'.format(result['playouts_per_sec'] / old['playouts_per_sec'])
+            print(line)
+    return results,mismatches
+
+def loadBaseline(path):
+    """
+    Results of a results file, by (position, benchmark)
+    """
+    with open(path) as f:
+        data=json.load(f)
+    return {(r['position'], r['benchmark']): r for r in data['results']}
+
+def main():
+    parser=argparse.ArgumentParser(description='Benchmarks of the search and the playouts')
+    parser.add_argument('--player', default='gomoku4', choices=sorted(PLAYER_MODULES),
+                        help='directory of the player whose search and playouts are timed')
+    parser.add_argument('--positions', default=os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'positions.txt'))
+    parser.add_argument('--depth', type=int, default=2,
+                        help='largest depth of the iterative deepening')
+    parser.add_argument('--prune-far', action='store_true',
+                        help='drop the moves far from all stones from the search')
+    parser.add_argument('--playouts', type=int, default=200,
+                        help='playouts per position and policy')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='bench_search_results.json')
+    parser.add_argument('--baseline', help='results file to compare with')
+    args=parser.parse_args()
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                    args.player))
+    baseline=loadBaseline(args.baseline) if args.baseline else None
+    results,mismatches=runBenchmarks(args.player, loadPositions(args.positions),
+                                     args.depth, args.playouts, args.seed,
+                                     baseline, args.prune_far)
+    with open(args.output, 'w') as f:
+        json.dump({'player': args.player, 'commit': commitId(),
+                   'python': platform.python_version(),
+                   'depth': args.depth, 'prune_far': args.prune_far,
+                   'playouts': args.playouts,
+                   'seed': args.seed, 'results': results}, f, indent=1)
+    print('results written to', args.output)
+    if mismatches:
+        print('{} searches differ from the baseline'.format(mismatches))
+        sys.exit(1)
+
+if __name__=='__main__':
+    main()
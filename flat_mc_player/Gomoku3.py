@@ -5,21 +5,37 @@
 from gtp_connection import GtpConnection
 from board_util import GoBoardUtil, EMPTY
 from simple_board import SimpleGoBoard
+from batch_playout import batch_playouts
+from playout_pool import PlayoutPool, default_workers
+from mcts import SearchTree, MAX_NODES, UCB_C
+from deadline import Deadline
 
 import random
 import numpy as np
 
-def undo(board,move):
-    board.board[move]=EMPTY
-    board.current_player=GoBoardUtil.opponent(board.current_player)
+"""
+Playouts per candidate move in one batch of the random policy
+"""
+PLAYOUTS_PER_BATCH = 64
+
+"""
+Most random-policy playouts in one call of batch_playouts within a round
+over the moves, so the deadline is checked at least every 1024 playouts
+"""
+PLAYOUTS_PER_CALL = 1024
+
+"""
+Seconds before the deadline at which playout workers stop, so that
+their results are sent back in time
+"""
+TIME_MARGIN = 0.1
 
 def play_move(board, move, color):
-    board.play_move_gomoku(move, color)
+    return board.play_move_gomoku(move, color)
 
 def game_result(board):
     game_end, winner = board.check_game_end_gomoku()
-    moves = board.get_empty_points()
-    board_full = (len(moves) == 0)
+    board_full = (board.num_empty_points() == 0)
     if game_end:
         #return 1 if winner == board.current_player else -1
         return winner
@@ -27,6 +43,28 @@ def game_result(board):
         return 'draw'
     return None
 
+def root_playouts(args):
+    """
+    Task of a playout worker: playouts of moves on its copy of the board,
+    shared out by allocation for the given seconds, or without a time
+    limit, seconds None, for per_move playouts per move.
+    Returns (wins, visits) arrays.
+    """
+    board, moves, playout_policy, allocation, seconds, per_move, seed = args
+    random.seed(seed)
+    np.random.seed(seed)
+    player = GomokuSimulationPlayer(n_simualtions_per_move=per_move,
+                                    playout_policy=playout_policy)
+    player.set_allocation(allocation)
+    player.wins = np.zeros(len(moves))
+    player.visits = np.zeros(len(moves))
+    if seconds is None:
+        deadline = Deadline()
+    else:
+        deadline = Deadline(seconds, reserve=0)
+    player._allocate(board, moves, deadline)
+    return player.wins, player.visits
+
 class GomokuSimulationPlayer(object):
     """
     For each move do `n_simualtions_per_move` playouts,
@@ -45,11 +83,40 @@ class GomokuSimulationPlayer(object):
         self.name="Gomoku3"
         self.version = 3.0
         self.best_move=None
+        self.pool=PlayoutPool()
+        self.allocation='uniform'
+        # statistics of the moves of the last get_move
+        self.stats_moves=[]
+        self.wins=np.zeros(0)
+        self.visits=np.zeros(0)
+
+    def set_workers(self, workers):
+        """
+        Start a pool of workers processes for the playouts of get_move,
+        1 runs them in this process. run starts one worker per core.
+        """
+        self.pool.resize(workers)
+
+    def close(self):
+        """
+        Stop the playout workers, before the engine exits
+        """
+        self.pool.close()
     
     def set_playout_policy(self, playout_policy='random'):
         assert(playout_policy in ['random', 'rule_based'])
         self.playout_policy=playout_policy
 
+    def set_allocation(self, allocation='uniform'):
+        """
+        How get_move shares out the playouts between the moves:
+        uniform: every move in turn
+        bandit: UCB1 with a time limit, sequential halving of
+            the fixed budget without
+        """
+        assert(allocation in ['uniform', 'bandit'])
+        self.allocation=allocation
+
     def _random_moves(self, board, color_to_play):
         return GoBoardUtil.generate_legal_moves_gomoku(board)
     
@@ -69,13 +136,16 @@ class GomokuSimulationPlayer(object):
         res=game_result(board)
         simulation_moves=[]
         while(res is None):
-            _ , candidate_moves = self.policy_moves(board, board.current_player)
-            playout_move=random.choice(candidate_moves)
+            if self.playout_policy=='random':
+                playout_move=board.random_empty_point()
+            else:
+                _ , candidate_moves = self.policy_moves(board, board.current_player)
+                playout_move=random.choice(candidate_moves)
             play_move(board, playout_move, board.current_player)
             simulation_moves.append(playout_move)
             res=game_result(board)
-        for m in simulation_moves[::-1]:
-            undo(board, m)
+        for _ in simulation_moves:
+            board.undo_move()
         if res == color_to_play:
             return 1.0
         elif res == 'draw':
@@ -84,43 +154,386 @@ class GomokuSimulationPlayer(object):
             assert(res == GoBoardUtil.opponent(color_to_play))
             return -1.0
 
-    def get_move(self, board, color_to_play):
+    def get_move(self, board, color_to_play, deadline=None):
         """
-        The genmove function called by gtp_connection
+        The genmove function called by gtp_connection.
+        With a time limit the playouts go on until deadline. Without,
+        deadline None or unlimited, the budget is n_simualtions_per_move
+        playouts per move. With more than one worker the playouts are
+        shared out among them, see _get_move_parallel.
         """
+        if deadline is None:
+            deadline=Deadline()
         moves=GoBoardUtil.generate_legal_moves_gomoku(board)
+        self.stats_moves=moves
+        self.wins=np.zeros(len(moves))
+        self.visits=np.zeros(len(moves))
+        move=self._immediate_win(board, moves)
+        if move is not None:
+            #This move is a immediate win
+            self.best_move=move
+            return move
+        self.best_move=moves[0]
+        if self.pool.workers > 1:
+            self._get_move_parallel(board, moves, deadline)
+        else:
+            self._allocate(board, moves, deadline)
+        return self.best_move
+
+    def _allocate(self, board, moves, deadline):
+        """
+        Play out moves in this process as set by allocation, until
+        deadline or, without a time limit, for n_simualtions_per_move
+        playouts per move
+        """
+        if deadline.unlimited():
+            if self.allocation=='bandit':
+                self._sequential_halving(board, moves,
+                                         self.n_simualtions_per_move * len(moves))
+            else:
+                self._uniform(board, moves, deadline, self.n_simualtions_per_move)
+        elif self.allocation=='bandit':
+            self._ucb(board, moves, deadline)
+        else:
+            self._uniform(board, moves, deadline)
+
+    def _immediate_win(self, board, moves):
+        """
+        Return the first move that wins at once, or None
+        """
         toplay=board.current_player
-        best_result, best_move=-1.1, None
-        best_move=moves[0]
-        wins = np.zeros(len(moves))
-        visits = np.zeros(len(moves))
+        for move in moves:
+            play_move(board, move, toplay)
+            res=game_result(board)
+            board.undo_move()
+            if res == toplay:
+                return move
+        return None
+
+    def _batch_size(self):
+        """
+        Playouts per move in one round: the random policy runs them
+        in batches with batch_playouts
+        """
+        return PLAYOUTS_PER_BATCH if self.playout_policy=='random' else 1
+
+    def _playouts(self, board, first_moves, rng=np.random):
+        """
+        Play one playout for each of first_moves, return the array of
+        results for the player to move, as in _do_playout
+        """
+        if self.playout_policy=='random':
+            return batch_playouts(board, first_moves, rng)
+        toplay=board.current_player
+        results=np.zeros(len(first_moves))
+        for i, move in enumerate(first_moves):
+            play_move(board, move, toplay)
+            results[i]=self._do_playout(board, toplay)
+            board.undo_move()
+        return results
+
+    def _play_arms(self, board, moves, arms, count, rng=np.random):
+        """
+        Play count playouts of moves[i] for each i in arms and add them to
+        wins and visits. best_move becomes the move with the best
+        mean result.
+        """
+        arms=np.asarray(arms)
+        results=self._playouts(board, np.repeat(np.asarray(moves)[arms], count), rng)
+        self.wins[arms] += results.reshape(len(arms), count).sum(axis=1)
+        self.visits[arms] += count
+        mean=np.where(self.visits > 0, self.wins / np.maximum(self.visits, 1), -np.inf)
+        self.best_move=moves[int(np.argmax(mean))]
+
+    def _play_round(self, board, moves, arms, count, deadline, rng=np.random):
+        """
+        Play count playouts of each of arms with _play_arms, a few arms at
+        a time, and stop early once deadline has expired. The random
+        policy plays up to PLAYOUTS_PER_CALL playouts at a time, the
+        rule_based one a single arm. The first call is always played.
+        Returns True if the round was completed.
+        """
+        if self.playout_policy=='random':
+            step=max(1, PLAYOUTS_PER_CALL // count)
+        else:
+            step=1
+        for start in range(0, len(arms), step):
+            if start > 0 and deadline.expired():
+                return False
+            self._play_arms(board, moves, arms[start:start + step], count, rng)
+        return True
+
+    def _uniform(self, board, moves, deadline, per_move=None):
+        """
+        Play out all moves in turn, per_move times each or until deadline.
+        The deadline is checked during a round, see _play_round.
+        """
+        arms=np.arange(len(moves))
+        batch=self._batch_size()
+        done=0
         while True:
-            for i, move in enumerate(moves):
-                play_move(board, move, toplay)
-                res=game_result(board)
-                if res == toplay:
-                    undo(board, move)
-                    #This move is a immediate win
-                    self.best_move=move
-                    return move
-                ret=self._do_playout(board, toplay)
-                wins[i] += ret
-                visits[i] += 1
-                win_rate = wins[i] / visits[i]
-                if win_rate > best_result:
-                    best_result=win_rate
-                    best_move=move
-                    self.best_move=best_move
-                undo(board, move)
-        assert(best_move is not None)
-        return best_move
+            count=batch if per_move is None else min(batch, per_move - done)
+            if not self._play_round(board, moves, arms, count, deadline):
+                return
+            done += count
+            if deadline.expired() or (per_move is not None and done >= per_move):
+                return
+
+    def _ucb(self, board, moves, deadline):
+        """
+        UCB1 allocation until deadline: play out the move with the
+        highest upper confidence bound on its mean result. best_move
+        becomes the most visited move, as in _get_move_parallel.
+        """
+        if self._play_round(board, moves, np.arange(len(moves)), 1, deadline):
+            batch=self._batch_size()
+            while not deadline.expired():
+                # results -1, 0, 1 scaled to rewards in [0, 1]
+                mean=(self.wins / self.visits + 1) / 2
+                ucb=mean + UCB_C * np.sqrt(np.log(self.visits.sum()) / self.visits)
+                self._play_arms(board, moves, [int(np.argmax(ucb))], batch)
+        self._most_visited(moves)
+
+    def _most_visited(self, moves):
+        """
+        Make best_move the most visited of moves, and of those the one
+        with the best mean result
+        """
+        mean=np.where(self.visits > 0, self.wins / np.maximum(self.visits, 1), -np.inf)
+        self.best_move=moves[int(np.lexsort((-mean, -self.visits))[0])]
+
+    def _sequential_halving(self, board, moves, budget):
+        """
+        Sequential halving of budget playouts: the budget is split over
+        log2(len(moves)) rounds, and after each round the better half
+        of the moves by mean result goes on
+        """
+        arms=np.arange(len(moves))
+        rounds=max(1, int(np.ceil(np.log2(len(moves)))))
+        for _ in range(rounds):
+            count=max(1, budget // (rounds * len(arms)))
+            self._play_arms(board, moves, arms, count)
+            mean=self.wins[arms] / self.visits[arms]
+            arms=arms[np.argsort(-mean, kind='stable')[:(len(arms) + 1) // 2]]
+            self.best_move=moves[int(arms[0])]
+
+    def _get_move_parallel(self, board, moves, deadline):
+        """
+        get_move with root parallel playouts: every worker plays out the
+        moves on its own board copy as set by allocation, until
+        TIME_MARGIN before deadline or, without a time limit, for its
+        share of n_simualtions_per_move playouts per move. Then the wins
+        and visits of all workers are added up. The uniform allocation
+        picks the move with the best mean result, the bandit allocations
+        the most visited move, which they found best.
+        """
+        workers=self.pool.workers
+        if deadline.unlimited():
+            seconds=None
+            per_move=max(1, -(-self.n_simualtions_per_move // workers))
+        else:
+            # a worker without any time left still plays one round
+            seconds=max(deadline.remaining() - TIME_MARGIN, 1e-3)
+            per_move=self.n_simualtions_per_move
+        tasks=[(board, moves, self.playout_policy, self.allocation, seconds,
+                per_move, random.getrandbits(32))
+               for _ in range(workers)]
+        for w, v in self.pool.map(root_playouts, tasks):
+            self.wins += w
+            self.visits += v
+        if self.allocation=='bandit':
+            self._most_visited(moves)
+        else:
+            mean=self.wins / np.maximum(self.visits, 1)
+            self.best_move=moves[int(np.argmax(mean))]
+
+    def ponder(self, board, deadline):
+        """
+        Search on the opponent's time. Flat playouts keep nothing from one
+        move to the next, so there is nothing to do.
+        """
+        return None
+
+    def move_statistics(self):
+        """
+        Return (move, visits, win rate) for the moves of the last get_move,
+        most visited first. A draw counts as half a win.
+        """
+        rates=np.where(self.visits > 0,
+                       (self.wins / np.maximum(self.visits, 1) + 1) / 2, 0.0)
+        order=np.lexsort((-rates, -self.visits))
+        return [(self.stats_moves[i], int(self.visits[i]), float(rates[i]))
+                for i in order]
+
+class MCTSPlayer(GomokuSimulationPlayer):
+    """
+    UCT Monte Carlo Tree Search with the playout policies of
+    GomokuSimulationPlayer. The tree of the last search is kept,
+    and reused if the game goes on from its root on a board of the
+    same size.
+    """
+    def __init__(self, playout_policy='random', board_size=7, max_nodes=MAX_NODES):
+        GomokuSimulationPlayer.__init__(self, playout_policy=playout_policy,
+                                        board_size=board_size)
+        self.max_nodes=max_nodes
+        self.tree=None
+        self.root_moves=None
+        self.root_player=None
+        self.root_size=None
+        self.simulations=0
+
+    def get_move(self, board, color_to_play, deadline=None):
+        """
+        The genmove function called by gtp_connection. Without a time
+        limit, deadline None or unlimited, the search runs
+        n_simualtions_per_move simulations per legal move.
+        """
+        if deadline is None:
+            deadline=Deadline()
+        moves=GoBoardUtil.generate_legal_moves_gomoku(board)
+        move=self._immediate_win(board, moves)
+        if move is not None:
+            self.best_move=move
+            return move
+        self.best_move=moves[0]
+        budget=self.n_simualtions_per_move * len(moves)
+        self._set_root(board)
+        self.search(board, deadline, budget)
+        return self.best_move
+
+    def _set_root(self, board):
+        """
+        Make the position of board the root of the tree
+        """
+        self.tree=self._reuse_tree(board)
+        self.root_moves=list(board.moves)
+        self.root_player=board.current_player
+        self.root_size=board.size
+
+    def _reuse_tree(self, board):
+        """
+        Return the subtree of the last tree for the position of board,
+        if board has the same size and continues the game from its root,
+        else a new tree
+        """
+        tree=self.tree
+        history=board.moves
+        if tree is None or board.size != self.root_size or \
+           history[:len(self.root_moves)] != self.root_moves:
+            return SearchTree(self.max_nodes)
+        node=0
+        toplay=self.root_player
+        for point, player in history[len(self.root_moves):]:
+            # the tree only has moves of alternating colors
+            if player != toplay or board.board[point] != toplay:
+                return SearchTree(self.max_nodes)
+            node=tree.find_child(node, point)
+            if node is None:
+                return SearchTree(self.max_nodes)
+            toplay=GoBoardUtil.opponent(toplay)
+        if node == 0:
+            return tree
+        return tree.subtree(node)
+
+    def search(self, board, deadline, budget):
+        """
+        Run simulations from board until deadline, or budget simulations
+        if deadline is unlimited, at least one
+        """
+        self.simulations=0
+        while True:
+            self._simulate(board)
+            self.simulations += 1
+            if deadline.unlimited():
+                if self.simulations >= budget:
+                    break
+            elif deadline.expired():
+                break
+        self._update_best_move()
+
+    def ponder(self, board, deadline):
+        """
+        Search on the opponent's time: run simulations from board, the
+        position after our move, until deadline expires or is cancelled.
+        The tree is kept, so get_move goes on from the subtree of whatever
+        move the opponent plays, if it was expanded.
+        """
+        if game_result(board) is not None:
+            return
+        self._set_root(board)
+        self.simulations=0
+        while not deadline.expired():
+            self._simulate(board)
+            self.simulations += 1
+
+    def move_statistics(self):
+        """
+        Return (move, visits, win rate) for the children of the root,
+        most visited first
+        """
+        tree=self.tree
+        if tree is None or not tree.is_expanded(0):
+            return []
+        children=sorted(tree.children(0), key=lambda c: -tree.visits[c])
+        return [(int(tree.move[c]), int(tree.visits[c]),
+                 tree.wins[c] / tree.visits[c] if tree.visits[c] else 0.0)
+                for c in children]
+
+    def _update_best_move(self):
+        best=self.tree.best_child(0)
+        if best is not None:
+            self.best_move=int(self.tree.move[best])
+
+    def _simulate(self, board):
+        """
+        One simulation: select with UCB1 down to a leaf, expand it on its
+        second visit, play out and update the nodes on the path
+        """
+        tree=self.tree
+        node=0
+        # (node, player who made its move)
+        path=[(0, GoBoardUtil.opponent(board.current_player))]
+        res=game_result(board)
+        while res is None:
+            if not tree.is_expanded(node):
+                if node != 0 and tree.visits[node] == 0:
+                    break
+                if not tree.can_expand(board.num_empty_points()):
+                    break
+                tree.expand(node, board.get_empty_points())
+            node=tree.select(node)
+            player=board.current_player
+            if not play_move(board, int(tree.move[node]), player):
+                # the tree does not match the board, play out from here
+                break
+            path.append((node, player))
+            res=game_result(board)
+        if res is None:
+            toplay=board.current_player
+            result=self._do_playout(board, toplay)
+            if result > 0:
+                res=toplay
+            elif result < 0:
+                res=GoBoardUtil.opponent(toplay)
+            else:
+                res='draw'
+        for node, player in path:
+            if res == 'draw':
+                tree.update(node, 0.5)
+            else:
+                tree.update(node, 1.0 if res == player else 0.0)
+        for _ in range(len(path) - 1):
+            board.undo_move()
 
 def run():
     """
     start the gtp connection and wait for commands.
     """
     board = SimpleGoBoard(7)
-    con = GtpConnection(GomokuSimulationPlayer(), board)
+    engines = {'flat': GomokuSimulationPlayer(), 'mcts': MCTSPlayer()}
+    # started before the first genmove, the workers command can resize it
+    engines['flat'].set_workers(default_workers())
+    con = GtpConnection(engines['flat'], board, engines=engines)
     con.start_connection()
 
 if __name__=='__main__':
@@ -1,21 +1,33 @@
 from board_util import GoBoardUtil, BLACK, WHITE, EMPTY, BORDER
 #from profilehooks import profile
 
-def undo(board,move):
-    board.board[move]=EMPTY
-    board.current_player=GoBoardUtil.opponent(board.current_player)
-
 def game_end(board):
     game_end, winner = board.check_game_end_gomoku()
-    moves = board.get_empty_points()
-    board_full = (len(moves) == 0)
+    board_full = (board.num_empty_points() == 0)
     if game_end:
         return 1 if winner == board.current_player else -1
     if board_full:
         return 0
     return None
 
+"""
+Deadline of the running solve, None without a time limit. It is polled
+at every node; once it has expired stopped is set and the search
+unwinds without a result.
+"""
+current_deadline = None
+stopped = False
+
+def out_of_time():
+    global stopped
+    if not stopped and current_deadline is not None \
+       and current_deadline.expired():
+        stopped = True
+    return stopped
+
 def alphabeta(board,alpha,beta):
+    if out_of_time():
+        return 0
     #print(GoBoardUtil.get_twoD_board(board),alpha,beta)
     result=game_end(board)
     if (result!=None):
@@ -25,56 +37,58 @@ def alphabeta(board,alpha,beta):
         #print(solvePoint[0])
         board.play_move_gomoku(solvePoint[0],board.current_player)
         result=-alphabeta(board,-beta,-alpha)
+        board.undo_move()
+        if stopped:
+            return 0
         if(result>alpha):
             alpha=result
-        undo(board,solvePoint[0])
         if(result>=beta):
             return beta
     else:
         for m in GoBoardUtil.generate_legal_moves_gomoku(board):
             board.play_move_gomoku(m,board.current_player)
             result=-alphabeta(board,-beta,-alpha)
+            board.undo_move()
+            if stopped:
+                return 0
             if(result>alpha):
                 alpha=result
-            undo(board,m)
             if(result>=beta):
                 return beta
     return alpha
 
 #@profile
 """
-if have winning move, return _,winning_move
-else return have_draw,"NoMove"
+if have winning move, return True,winning_move,None
+else return have_draw,"NoMove",draw_move
+If the deadline expires first, return None,"NoMove",None
 """
-def solve(board):
+def solve(board, deadline=None):
     result=game_end(board)
     if (result!=None):
-        return result,"First"
+        return result,"First",None
+    global current_deadline, stopped
+    current_deadline,stopped=deadline,False
     alpha,beta=-1,1
-    haveDraw=False
+    drawMove=None
     solvePoint=board.list_solve_point()
     if solvePoint:
-        #print(solvePoint[0])
-        board.play_move_gomoku(solvePoint[0],board.current_player)
+        moves=solvePoint[:1]
+    else:
+        moves=GoBoardUtil.generate_legal_moves_gomoku(board)
+    for m in moves:
+        board.play_move_gomoku(m,board.current_player)
         result=-alphabeta(board,-beta,-alpha)
-        undo(board,solvePoint[0])
+        #print(GoBoardUtil.get_twoD_board(board))
+        #print(result)
+        board.undo_move()
+        if stopped:
+            return None,"NoMove",None
         if(result==1):
-            return True,solvePoint[0]
-        elif(result==0):
-            haveDraw=True
-    else: 
-        for m in GoBoardUtil.generate_legal_moves_gomoku(board):
-            board.play_move_gomoku(m,board.current_player)
-            result=-alphabeta(board,-beta,-alpha)
-            #print(GoBoardUtil.get_twoD_board(board))
-            #print(result)
-            undo(board,m)
-            if(result==1):
-                return True,m
-            elif(result==0):
-                haveDraw=True
-    return haveDraw,"NoMove"
-
+            return True,m,None
+        elif(result==0 and drawMove is None):
+            drawMove=m
+    return drawMove is not None,"NoMove",drawMove
 
     """
 
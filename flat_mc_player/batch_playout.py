@@ -0,0 +1,79 @@
+"""
+batch_playout.py
+Random playouts of many boards at once, as one stacked NumPy array.
+
+All boards of a batch start from the same position. Each board plays
+its empty points in a random order, so one step of the batch is one
+move on every board: a column of the order array is written into the
+stacked boards, and the new stones are checked for five in a row on
+all boards together.
+"""
+
+import numpy as np
+from board_util import GoBoardUtil, BORDER
+
+"""
+Results of a playout, from the view of the player to move at the start
+"""
+WIN = 1
+DRAW = 0
+LOSS = -1
+
+def five_offsets(NS):
+    """
+    Array offsets of the 9 points of the line segment centered on a point,
+    in each of the four directions: shape (4, 9)
+    """
+    steps = np.array([1, NS, NS + 1, NS - 1])
+    return steps[:, None] * np.arange(-4, 5)[None, :]
+
+def batch_playouts(board, first_moves, rng=np.random):
+    """
+    Play one random playout for each entry of first_moves, from the
+    position of board with board.current_player to move.
+    Each playout starts with its first move, which must be an empty
+    point, and then plays random empty points until a five or a full board.
+    The game must not be over on board.
+    Returns the array of results, WIN, DRAW or LOSS for the player to move.
+    """
+    first_moves = np.asarray(first_moves)
+    n = len(first_moves)
+    color = board.current_player
+    opp = GoBoardUtil.opponent(color)
+    empties = np.array(board.get_empty_points())
+    offsets = five_offsets(board.NS)
+    # border padding so that every segment stays inside the array
+    pad = int(offsets.max())
+    boards = np.full((n, board.maxpoint + 2 * pad), BORDER, dtype=np.int8)
+    boards[:, pad : pad + board.maxpoint] = board.board
+    offsets = offsets + pad
+
+    # random order of the empty points, with the first move in front
+    keys = rng.random_sample((n, len(empties)))
+    keys[empties[None, :] == first_moves[:, None]] = -1.0
+    moves = empties[np.argsort(keys, axis=1)]
+
+    results = np.zeros(n, dtype=np.int8)
+    active = np.arange(n)
+    for k in range(len(empties)):
+        to_play = color if k % 2 == 0 else opp
+        points = moves[active, k]
+        boards[active, points + pad] = to_play
+        five = _has_five(boards[active[:, None, None], points[:, None, None] + offsets],
+                         to_play)
+        if five.any():
+            results[active[five]] = WIN if to_play == color else LOSS
+            active = active[~five]
+            if len(active) == 0:
+                break
+    return results
+
+def _has_five(segments, color):
+    """
+    For each stack of line segments of shape (4, 9), whether one of them
+    has five consecutive stones of color
+    """
+    count = np.cumsum(segments == color, axis=2, dtype=np.int8)
+    runs = count[:, :, 4:].copy()
+    runs[:, :, 1:] -= count[:, :, :-5]
+    return (runs == 5).any(axis=(1, 2))
@@ -0,0 +1,79 @@
+"""
+bitboard.py
+Bitboard layout of the lines of the padded 1-dimensional board.
+
+All lines of 5 or more points are laid end to end into one bit string,
+each with the border point before and after it. A set of points is a
+Python int with the bit of every occurrence of each point set, one per
+direction. A pattern is then matched on all lines at once with one shift
+and one AND per pattern character.
+Two lines are separated by two border bits, and no pattern has a border
+anywhere but at its first or last character, so no match crosses lines.
+"""
+
+from line_tables import get_line_tables
+
+class BitboardLayout(object):
+
+    def __init__(self, size):
+        """
+        Build the layout for a board of given size
+
+        bit_points: the board point of each bit
+        point_bits: for each point the bits of its occurrences
+        border: the bits of the border points at both ends of the lines
+        on_board: the bits of all points on the board
+        """
+        maxpoint = size * size + 3 * (size + 1)
+        self.bit_points = []
+        self.point_bits = [0] * maxpoint
+        self.border = 0
+        for line in get_line_tables(size).padded_lines:
+            if len(line) < 7:
+                continue
+            last = len(line) - 1
+            for i, point in enumerate(line):
+                bit = 1 << len(self.bit_points)
+                if i == 0 or i == last:
+                    self.border |= bit
+                else:
+                    self.point_bits[point] |= bit
+                self.bit_points.append(point)
+        self.on_board = 0
+        for bits in self.point_bits:
+            self.on_board |= bits
+
+    def match(self, masks, pattern):
+        """
+        Return the bits where a window matching pattern starts.
+        masks maps each pattern character to the bits it matches.
+        """
+        found = masks[pattern[0]]
+        for j in range(1, len(pattern)):
+            found &= masks[pattern[j]] >> j
+        return found
+
+    def points(self, bits):
+        """
+        Yield the board point of each set bit
+        """
+        bit_points = self.bit_points
+        while bits:
+            low = bits & -bits
+            yield bit_points[low.bit_length() - 1]
+            bits ^= low
+
+"""
+Layouts built so far, by board size
+"""
+_layouts = {}
+
+def get_bitboard_layout(size):
+    """
+    Return the shared BitboardLayout for size, building it on first use
+    """
+    layout = _layouts.get(size)
+    if layout is None:
+        layout = BitboardLayout(size)
+        _layouts[size] = layout
+    return layout
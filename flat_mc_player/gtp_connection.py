@@ -12,11 +12,12 @@ from board_util import GoBoardUtil, BLACK, WHITE, EMPTY, BORDER, PASS, \
                        MAXSIZE, coord_to_point
 import numpy as np
 import re
-import signal
+import threading
+from deadline import Deadline
 
 class GtpConnection():
 
-    def __init__(self, go_engine, board, debug_mode = False):
+    def __init__(self, go_engine, board, debug_mode = False, engines = None):
         """
         Manage a GTP connection for a Go-playing engine
 
@@ -26,11 +27,13 @@ class GtpConnection():
             a program that can reply to a set of GTP commandsbelow
         board: 
             Represents the current board state.
+        engines:
+            engines by name, the engine command switches between them
         """
         self._debug_mode = debug_mode
         self.go_engine = go_engine
+        self.engines = engines if engines is not None else {}
         self.board = board
-        signal.signal(signal.SIGALRM, self.handler)
         self.commands = {
             "protocol_version": self.protocol_version_cmd,
             "quit": self.quit_cmd,
@@ -56,8 +59,16 @@ class GtpConnection():
             "solve": self.solve_cmd,
             "list_solve_point": self.list_solve_point_cmd, # below is added for Gomoku3
             "policy": self.set_playout_policy, 
-            "policy_moves": self.display_pattern_moves
+            "policy_moves": self.display_pattern_moves,
+            "workers": self.workers_cmd,
+            "engine": self.engine_cmd,
+            "allocation": self.allocation_cmd,
+            "move_stats": self.move_stats_cmd,
+            "ponder": self.ponder_cmd
         }
+        self.pondering=False
+        self.ponder_thread=None
+        self.ponder_deadline=None
         self.timelimit=2
 
         # used for argument checking
@@ -66,11 +77,16 @@ class GtpConnection():
         self.argmap = {
             "boardsize": (1, 'Usage: boardsize INT'),
             "komi": (1, 'Usage: komi FLOAT'),
+            "timelimit": (1, 'Usage: timelimit SECONDS'),
+            "ponder": (1, 'Usage: ponder {on,off}'),
             "known_command": (1, 'Usage: known_command CMD_NAME'),
             "genmove": (1, 'Usage: genmove {w,b}'),
             "play": (2, 'Usage: play {b,w} MOVE'),
             "legal_moves": (1, 'Usage: legal_moves {w,b}'),
-            "policy":(1, 'Usage: set playout policy {random, rule_based}')
+            "policy":(1, 'Usage: set playout policy {random, rule_based}'),
+            "workers": (1, 'Usage: workers INT'),
+            "engine": (1, 'Usage: engine NAME'),
+            "allocation": (1, 'Usage: allocation {uniform, bandit}')
         }
     
     def set_playout_policy(self, args):
@@ -87,8 +103,7 @@ class GtpConnection():
             else:
                 self.respond("")
             return
-        all_moves=self.board.get_empty_points()
-        if len(all_moves) == 0:
+        if self.board.num_empty_points() == 0:
             self.respond('')
             return
         moveType, moves=self.go_engine.policy_moves(self.board, color)
@@ -112,8 +127,37 @@ class GtpConnection():
         """
         line = stdin.readline()
         while line:
+            self.stop_pondering()
             self.get_cmd(line)
             line = stdin.readline()
+        self.stop_pondering()
+        self.close_engines()
+
+    def start_pondering(self):
+        """
+        Search on the opponent's time, from a copy of the board after our
+        move, until the next command arrives. See the engine's ponder.
+        """
+        if not self.pondering:
+            return
+        self.ponder_deadline = Deadline()
+        self.ponder_thread = threading.Thread(
+            target=self.go_engine.ponder,
+            args=(self.board.copy(), self.ponder_deadline), daemon=True)
+        self.ponder_thread.start()
+
+    def close_engines(self):
+        """ Stop the playout workers of every engine """
+        for engine in set(self.engines.values()) | {self.go_engine}:
+            engine.close()
+
+    def stop_pondering(self):
+        """ Cancel the pondering search and wait for it to return """
+        if self.ponder_thread is None:
+            return
+        self.ponder_deadline.cancel()
+        self.ponder_thread.join()
+        self.ponder_thread = None
 
     def get_cmd(self, command):
         """
@@ -187,6 +231,7 @@ class GtpConnection():
 
     def quit_cmd(self, args):
         """ Quit game and exit the GTP interface """
+        self.close_engines()
         self.respond()
         exit()
 
@@ -281,29 +326,69 @@ class GtpConnection():
             self.respond('{}'.format(str(e)))
 
     def timelimit_cmd(self, args):
-        self.timelimit = args[0]
+        """
+        Seconds allowed for genmove and solve, fractions are allowed.
+        0 means no time limit, then the flat engine plays its fixed
+        number of playouts.
+        """
+        try:
+            self.timelimit = float(args[0])
+        except ValueError:
+            self.error('Usage: timelimit SECONDS')
+            return
         self.respond('')
 
-    def handler(self, signum, fram):
-        self.board = self.sboard
-        raise Exception("unknown")
+    def engine_cmd(self, args):
+        """ Switch to the engine named args[0], keeping the playout policy """
+        if args[0] not in self.engines:
+            self.error("unknown engine {}, one of: {}".format(
+                args[0], ' '.join(sorted(self.engines))))
+            return
+        engine = self.engines[args[0]]
+        engine.set_playout_policy(self.go_engine.playout_policy)
+        self.go_engine = engine
+        self.respond()
+
+    def allocation_cmd(self, args):
+        """ Set how the flat engine shares out its playouts, see set_allocation """
+        if args[0] not in ('uniform', 'bandit'):
+            self.error('Usage: allocation {uniform, bandit}')
+            return
+        self.go_engine.set_allocation(args[0])
+        self.respond()
+
+    def move_stats_cmd(self, args):
+        """ Visits and win rate of the moves of the last genmove, one per line """
+        lines = []
+        for move, visits, winrate in self.go_engine.move_statistics():
+            coords = point_to_coord(move, self.board.size)
+            lines.append('{} {} {:.3f}'.format(format_point(coords), visits, winrate))
+        self.respond('\n'.join(lines))
+
+    def workers_cmd(self, args):
+        """ Set the number of playout worker processes, 1 for none.
+        The engine starts with one per core. """
+        workers = int(args[0])
+        if workers < 1:
+            self.error("workers must be at least 1")
+            return
+        self.go_engine.set_workers(workers)
+        self.respond()
+
+    def ponder_cmd(self, args):
+        """ Search on the opponent's time after each genmove, on or off """
+        if args[0] not in ('on', 'off'):
+            self.error('Usage: ponder {on,off}')
+            return
+        self.pondering = (args[0] == 'on')
+        self.respond()
 
     def solve_cmd(self, args):
-        try:
-            self.sboard = self.board.copy()
-            signal.alarm(int(self.timelimit)-1)
-            winner,move = self.board.solve()
-            self.board = self.sboard
-            signal.alarm(0)
-            if move != "NoMove":
-                if move == None:
-                    self.respond('{} {}'.format(winner, self.board._point_to_coord(move)))
-                    return 
-                self.respond('{} {}'.format(winner, format_point(point_to_coord(move, self.board.size))))
-                return 
+        winner,move = self.board.solve(Deadline(self.timelimit))
+        if move == "NoMove":
             self.respond('{}'.format(winner))
-        except Exception as e:
-            self.respond('{}'.format(str(e)))
+            return
+        self.respond('{} {}'.format(winner, format_point(point_to_coord(move, self.board.size))))
 
     def genmove_cmd(self, args):
         """
@@ -318,20 +403,11 @@ class GtpConnection():
             else:
                 self.respond("resign")
             return
-        moves = self.board.get_empty_points()
-        board_is_full = (len(moves) == 0)
+        board_is_full = (self.board.num_empty_points() == 0)
         if board_is_full:
             self.respond("pass")
             return
-        move=None
-        try:
-            signal.alarm(int(self.timelimit))
-            self.sboard = self.board.copy()
-            move = self.go_engine.get_move(self.board, color)
-            self.board=self.sboard
-            signal.alarm(0)
-        except Exception as e:
-            move=self.go_engine.best_move
+        move = self.go_engine.get_move(self.board, color, Deadline(self.timelimit))
 
         if move == PASS:
             self.respond("pass")
@@ -341,6 +417,7 @@ class GtpConnection():
         if self.board.is_legal_gomoku(move, color):
             self.board.play_move_gomoku(move, color)
             self.respond(move_as_string)
+            self.start_pondering()
         else:
             self.respond("illegal move: {}".format(move_as_string))
 
@@ -400,8 +477,7 @@ class GtpConnection():
     
     def gogui_rules_final_result_cmd(self, args):
         game_end, winner = self.board.check_game_end_gomoku()
-        moves = self.board.get_empty_points()
-        board_full = (len(moves) == 0)
+        board_full = (self.board.num_empty_points() == 0)
         if board_full and not game_end:
             self.respond("draw")
             return
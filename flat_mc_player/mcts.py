@@ -0,0 +1,144 @@
+"""
+mcts.py
+Array-backed search tree for UCT Monte Carlo Tree Search.
+
+Nodes are indices into flat NumPy arrays. When a node is expanded all its
+children are allocated at once, in one contiguous block, so a node only
+stores the start and the size of its block. The statistics of a node are
+from the view of the player who made its move: wins is the sum of the
+playout rewards, 1 for a win, 0.5 for a draw and 0 for a loss.
+"""
+
+import numpy as np
+
+"""
+Exploration constant of UCB1
+"""
+UCB_C = 1.4
+
+"""
+Default node capacity: about 24 bytes per node, so 48MB
+"""
+MAX_NODES = 2000000
+
+class SearchTree(object):
+
+    def __init__(self, max_nodes=MAX_NODES, capacity=4096):
+        """
+        Creates a tree with only the root, node 0. The arrays grow by
+        doubling, the tree is not expanded beyond max_nodes nodes.
+        """
+        self.max_nodes = max_nodes
+        self.move = np.zeros(capacity, dtype=np.int32)
+        self.first_child = np.zeros(capacity, dtype=np.int32)
+        self.num_children = np.zeros(capacity, dtype=np.int32)
+        self.wins = np.zeros(capacity, dtype=np.float64)
+        self.visits = np.zeros(capacity, dtype=np.int32)
+        self.size = 1
+        self.move[0] = -1
+
+    def _grow(self, size):
+        capacity = len(self.move)
+        while capacity < size:
+            capacity *= 2
+        for name in ('move', 'first_child', 'num_children', 'wins', 'visits'):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def is_expanded(self, node):
+        return self.num_children[node] > 0
+
+    def can_expand(self, num_moves):
+        return self.size + num_moves <= self.max_nodes
+
+    def expand(self, node, moves):
+        """
+        Add a child for each of moves to node
+        """
+        start = self.size
+        end = start + len(moves)
+        if end > len(self.move):
+            self._grow(end)
+        self.move[start:end] = moves
+        self.first_child[node] = start
+        self.num_children[node] = len(moves)
+        self.size = end
+
+    def children(self, node):
+        start = self.first_child[node]
+        return range(start, start + self.num_children[node])
+
+    def select(self, node):
+        """
+        Return the child of node with the highest UCB1 value,
+        an unvisited child first
+        """
+        start = self.first_child[node]
+        end = start + self.num_children[node]
+        visits = self.visits[start:end]
+        unvisited = np.flatnonzero(visits == 0)
+        if len(unvisited):
+            return start + int(unvisited[0])
+        ucb = self.wins[start:end] / visits + \
+              UCB_C * np.sqrt(np.log(self.visits[node]) / visits)
+        return start + int(np.argmax(ucb))
+
+    def update(self, node, reward):
+        self.wins[node] += reward
+        self.visits[node] += 1
+
+    def best_child(self, node):
+        """
+        Return the most visited child of node, or None
+        """
+        if not self.is_expanded(node):
+            return None
+        start = self.first_child[node]
+        end = start + self.num_children[node]
+        return start + int(np.argmax(self.visits[start:end]))
+
+    def find_child(self, node, move):
+        """
+        Return the child of node for move, or None
+        """
+        for child in self.children(node):
+            if self.move[child] == move:
+                return child
+        return None
+
+    def subtree(self, node):
+        """
+        Return a new tree holding a copy of the subtree of node,
+        with node as its root
+        """
+        tree = SearchTree(self.max_nodes)
+        tree.move[0] = self.move[node]
+        tree.wins[0] = self.wins[node]
+        tree.visits[0] = self.visits[node]
+        # copy one block of children at a time
+        pending = [(node, 0)]
+        while pending:
+            old, new = pending.pop()
+            if not self.is_expanded(old):
+                continue
+            start = self.first_child[old]
+            block = slice(start, start + self.num_children[old])
+            tree.expand(new, self.move[block])
+            newStart = tree.first_child[new]
+            newBlock = slice(newStart, newStart + self.num_children[old])
+            tree.wins[newBlock] = self.wins[block]
+            tree.visits[newBlock] = self.visits[block]
+            for child in self.children(old):
+                if self.is_expanded(child):
+                    pending.append((child, newStart + child - start))
+        return tree
+
+    def memory(self):
+        """
+        Bytes used by the node arrays
+        """
+        return sum(a.nbytes for a in (self.move, self.first_child,
+                                      self.num_children, self.wins,
+                                      self.visits))
@@ -0,0 +1,52 @@
+"""
+playout_pool.py
+Persistent pool of worker processes for root-parallel playouts.
+
+The pool is started once, at engine start with one worker per core,
+and is reused by every genmove. It is only restarted when the number of
+workers is changed. Each task gets its own pickled copy of the board, so
+workers never share search state.
+"""
+
+import multiprocessing
+import os
+
+def default_workers():
+    """
+    Number of workers started with the engine: one per core
+    """
+    return os.cpu_count() or 1
+
+class PlayoutPool(object):
+
+    def __init__(self, workers=1):
+        """
+        Creates a pool of workers processes. With one worker no process
+        is started and the playouts run in the engine process.
+        """
+        self.workers = 1
+        self.pool = None
+        self.resize(workers)
+
+    def resize(self, workers):
+        """
+        Stop the current workers and start a pool of workers processes
+        """
+        assert workers >= 1
+        self.close()
+        self.workers = workers
+        if workers > 1:
+            self.pool = multiprocessing.Pool(workers)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+    def map(self, task, args):
+        """
+        Run task on each entry of args in the workers, return the results
+        """
+        assert self.pool is not None
+        return self.pool.map(task, args, chunksize=1)
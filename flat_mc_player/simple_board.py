@@ -10,11 +10,25 @@ The board uses a 1-dimensional representation with padding
 """
 
 import numpy as np
+import random
 from board_util import GoBoardUtil, BLACK, WHITE, EMPTY, BORDER, \
                        PASS, is_black_white, coord_to_point, where1d, \
                        MAXSIZE, NULLPOINT
+from bitboard import get_bitboard_layout
 import alphabeta
 
+"""
+Zobrist keys: a random 64-bit number for each (color, point) pair and one
+for white to move. The hash of a position is the XOR of the keys of its
+stones, so it is updated with one XOR per move and per undo.
+The generator is seeded so that hashes are the same in every run.
+"""
+_zobrist_random = random.Random(20190327)
+ZOBRIST_MAXPOINT = MAXSIZE * MAXSIZE + 3 * (MAXSIZE + 1)
+ZOBRIST_STONE = [[_zobrist_random.getrandbits(64) for _ in range(ZOBRIST_MAXPOINT)]
+                 for _ in range(BORDER + 1)]
+ZOBRIST_WHITE_TO_PLAY = _zobrist_random.getrandbits(64)
+
 class SimpleGoBoard(object):
 
     def get_color(self, point):
@@ -60,9 +74,49 @@ class SimpleGoBoard(object):
     def get_empty_points(self):
         """
         Return:
-            The empty points on the board
+            A list of the empty points on the board, in no particular order.
+            The list is a snapshot, callers may play moves while using it.
+        """
+        return list(self._empty_points)
+
+    def num_empty_points(self):
+        """
+        Return:
+            The number of empty points on the board, in O(1)
+        """
+        return len(self._empty_points)
+
+    def random_empty_point(self):
+        """
+        Return:
+            A uniformly random empty point in O(1), or PASS if there is none
+        """
+        if not self._empty_points:
+            return PASS
+        return random.choice(self._empty_points)
+
+    def _initialize_empty_point_set(self):
+        """
+        Build the set of empty points from the board array.
+        The set is an array with swap-remove plus an index from point to
+        position in that array, so add, remove and random choice are O(1).
         """
-        return where1d(self.board == EMPTY)
+        self._empty_points = [int(p) for p in where1d(self.board == EMPTY)]
+        self._empty_index = [-1] * self.maxpoint
+        for i, p in enumerate(self._empty_points):
+            self._empty_index[p] = i
+
+    def _remove_empty_point(self, point):
+        i = self._empty_index[point]
+        last = self._empty_points.pop()
+        if last != point:
+            self._empty_points[i] = last
+            self._empty_index[last] = i
+        self._empty_index[point] = -1
+
+    def _add_empty_point(self, point):
+        self._empty_index[point] = len(self._empty_points)
+        self._empty_points.append(point)
 
     def __init__(self, size):
         """
@@ -86,7 +140,14 @@ class SimpleGoBoard(object):
         self.board = np.full(self.maxpoint, BORDER, dtype = np.int32)
         self.liberty_of = np.full(self.maxpoint, NULLPOINT, dtype = np.int32)
         self._initialize_empty_points(self.board)
+        self._initialize_empty_point_set()
         self._initialize_neighbors()
+        self.winner = None
+        self.winning_move = None
+        self.moves = []
+        self._stone_hash = 0
+        self.bitboard = get_bitboard_layout(size)
+        self._bits = {BLACK: 0, WHITE: 0}
 
     def copy(self):
         b = SimpleGoBoard(self.size)
@@ -96,8 +157,24 @@ class SimpleGoBoard(object):
         b.current_player = self.current_player
         assert b.maxpoint == self.maxpoint
         b.board = np.copy(self.board)
+        b._empty_points = list(self._empty_points)
+        b._empty_index = list(self._empty_index)
+        b.winner = self.winner
+        b.winning_move = self.winning_move
+        b.moves = list(self.moves)
+        b._stone_hash = self._stone_hash
+        b._bits = dict(self._bits)
         return b
 
+    @property
+    def hash(self):
+        """
+        64-bit Zobrist key of the position: the stones plus the side to move
+        """
+        if self.current_player == WHITE:
+            return self._stone_hash ^ ZOBRIST_WHITE_TO_PLAY
+        return self._stone_hash
+
     def row_start(self, row):
         assert row >= 1
         assert row <= self.size
@@ -347,9 +424,48 @@ class SimpleGoBoard(object):
         assert point != PASS
         if self.board[point] != EMPTY:
             return False
+        self.moves.append((point, self.current_player))
         self.board[point] = color
+        self._remove_empty_point(point)
+        self._stone_hash ^= ZOBRIST_STONE[color][point]
+        self._bits[color] |= self.bitboard.point_bits[point]
         self.current_player = GoBoardUtil.opponent(color)
+        # only the lines through the new stone can create a new five
+        if self.winner is None and self.point_check_game_end_gomoku(point):
+            self.winner = color
+            self.winning_move = point
         return True
+
+    def undo_move(self):
+        """
+            Undo the last move played with play_move_gomoku
+            The move history is a stack: restores the side to move and all
+            state derived from the stones, then returns the undone point
+            """
+        point, previous_player = self.moves.pop()
+        color = self.board[point]
+        assert is_black_white(color)
+        self.board[point] = EMPTY
+        self._add_empty_point(point)
+        self._stone_hash ^= ZOBRIST_STONE[color][point]
+        self._bits[color] &= ~self.bitboard.point_bits[point]
+        self.current_player = previous_player
+        if point == self.winning_move:
+            self.winner = None
+            self.winning_move = None
+        return point
+
+    def push(self, point):
+        """
+            Play point for the player to move, see play_move_gomoku
+            """
+        return self.play_move_gomoku(point, self.current_player)
+
+    def pop(self):
+        """
+            Take back the last move played, see undo_move
+            """
+        return self.undo_move()
         
     def _point_direction_check_connect_gomoko(self, point, shift):
         """
@@ -365,7 +481,7 @@ class SimpleGoBoard(object):
             if self.board[p] == color:
                 count = count + 1
                 if count == 5:
-                    break
+                    return True
             else:
                 break
         d = -d
@@ -375,11 +491,10 @@ class SimpleGoBoard(object):
             if self.board[p] == color:
                 count = count + 1
                 if count == 5:
-                    break
+                    return True
             else:
                 break
-        assert count <= 5
-        return count == 5
+        return False
     
     def point_check_game_end_gomoku(self, point):
         """
@@ -406,25 +521,25 @@ class SimpleGoBoard(object):
     def check_game_end_gomoku(self):
         """
             Check if the game ends for the game of Gomoku.
+            The winner is recorded by play_move_gomoku, so this is O(1).
             """
-        white_points = where1d(self.board == WHITE)
-        black_points = where1d(self.board == BLACK)
-        
-        for point in white_points:
-            if self.point_check_game_end_gomoku(point):
-                return True, WHITE
-    
-        for point in black_points:
-            if self.point_check_game_end_gomoku(point):
-                return True, BLACK
-
+        if self.winner is not None:
+            return True, self.winner
         return False, None
 
-    def solve(self):
-        result, move, drawMove = alphabeta.solve(self)
+    def solve(self, deadline=None):
+        """
+        Solve the position for the player to move, within deadline.
+        Returns (winner, move): winner is 'b', 'w', 'draw' or 'unknown'
+        if the search ran out of time, and move is the winning or drawing
+        move, or "NoMove".
+        """
+        result, move, drawMove = alphabeta.solve(self, deadline)
+        if result is None:
+            return 'unknown','NoMove'
         if move=="First":
             if result==0:
-                return 'draw',drawMove
+                return 'draw','NoMove'
             else:
                 winner='w' if self.current_player!=WHITE else 'b'
                 return winner,'NoMove'
@@ -438,29 +553,31 @@ class SimpleGoBoard(object):
             winner='w' if self.current_player==WHITE else 'b'
             return winner, move
 
-    def check_pattern(self,point,have,direction_x,direction_y,moveSet,patternList,color,flag):
-        for i in range(0,4):
-            if have in patternList[i]:
-                for dis in patternList[i][have]:
-                    moveSet[i].add(point-direction_x*(dis+1)-direction_y*self.NS*(dis+1))
-                #flag[0]=True
-                break
-        if (not (0<= point<len(self.board))) or len(have)==9:
-            return
-#if self.get_color(point)==BORDER or len(have)==7:
-#            return
-        piece=self.get_color(point)
-        if piece==EMPTY:
-            piece='.'
-        elif piece==color:
-            piece='x'
-        elif piece == BORDER:
-            piece='B'
-        else:
-            piece='o'
-        have+=piece
-        #print(GoBoardUtil.format_point(self._point_to_coord(point)),have,self.board[point])
-        self.check_pattern(point+direction_x+direction_y*self.NS,have,direction_x,direction_y,moveSet,patternList,color,flag)
+    def _pattern_masks(self, color):
+        """
+        Bitboards of the pattern characters for color:
+        x color, o the opponent, . empty and B the border
+        """
+        mine = self._bits[color]
+        theirs = self._bits[GoBoardUtil.opponent(color)]
+        return {'x': mine, 'o': theirs,
+                '.': self.bitboard.on_board & ~(mine | theirs),
+                'B': self.bitboard.border}
+
+    def _pattern_move_set(self, patterns, masks):
+        """
+        Return the moves of all windows of the lines matching a pattern.
+        Each pattern maps to its moves, given as distances back from
+        the last point of the window.
+        """
+        layout = self.bitboard
+        moves = set()
+        for pattern, distances in patterns.items():
+            found = layout.match(masks, pattern)
+            if found:
+                for dis in distances:
+                    moves.update(layout.points(found << (len(pattern) - 1 - dis)))
+        return moves
 
     def get_pattern_moves(self):
         """
@@ -468,7 +585,6 @@ class SimpleGoBoard(object):
         2. urgent blocking point xoooo.
         3. wining in 2 step point
         """
-        moveSet=[set(),set(),set(),set()]
         color=self.current_player
 
         patternList=[{'xxxx.':{0},'xxx.x':{1},'xx.xx':{2},'x.xxx':{3},'.xxxx':{4}}, #win
@@ -478,22 +594,12 @@ class SimpleGoBoard(object):
                      'x.ooo..':{0}, '..ooo.x':{6} #block-open-four
                      }]
 
-        direction_x=[1,0,1,-1]
-        direction_y=[0,1,1,1]
-        flag=[False]
-
-        for point in range(0, len(self.board)):
-            if flag[0]:
-                break
-            for direction in range(0,4):
-                    self.check_pattern(point,'',direction_x[direction],direction_y[direction],moveSet,patternList,color,flag)
-        
-        i=0
-        while i<4 and not bool(moveSet[i]): i+=1
-        if i==4:
-            return None
-        else:
-            return i, list(moveSet[i])
+        masks=self._pattern_masks(color)
+        for i, patterns in enumerate(patternList):
+            moves=self._pattern_move_set(patterns, masks)
+            if moves:
+                return i, list(moves)
+        return None
             
     def list_solve_point(self):
         """
@@ -501,25 +607,13 @@ class SimpleGoBoard(object):
         2. urgent blocking point xoooo.
         3. wining in 2 step point
         """
-        moveSet=[set(),set(),set(),set()]
         color=self.current_player
 
         patternList=[{'xxxx.':{0},'xxx.x':{1},'xx.xx':{2},'x.xxx':{3},'.xxxx':{4}},{'oooo.':{0},'ooo.o':{1},'oo.oo':{2},'o.ooo':{3},'.oooo':{4}},{'.xxx..':{1},'..xxx.':{4},'.xx.x.':{2},'.x.xx.':{3}},{'.ooo..':{1,5},'..ooo.':{0,4},'.oo.o.':{2},'.o.oo.':{3}}]
 
-        direction_x=[1,0,1,-1]
-        direction_y=[0,1,1,1]
-        flag=[False]
-
-        for point in where1d(self.board!=BORDER):
-            if flag[0]:
-                break
-            for direction in range(0,4):
-                    self.check_pattern(point,'',direction_x[direction],direction_y[direction],moveSet,patternList,color,flag)
-        
-        i=0
-        while i<4 and not bool(moveSet[i]):
-            i+=1
-        if i==4:
-            return None
-        else:
-            return list(moveSet[i])
+        masks=self._pattern_masks(color)
+        for patterns in patternList:
+            moves=self._pattern_move_set(patterns, masks)
+            if moves:
+                return list(moves)
+        return None
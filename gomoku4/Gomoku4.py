@@ -9,17 +9,12 @@ from simple_board import SimpleGoBoard
 import random
 import numpy as np
 
-def undo(board,move):
-    board.board[move]=EMPTY
-    board.current_player=GoBoardUtil.opponent(board.current_player)
-
 def play_move(board, move, color):
     board.play_move_gomoku(move, color)
 
 def game_result(board):
     game_end, winner = board.check_game_end_gomoku()
-    moves = board.get_empty_points()
-    board_full = (len(moves) == 0)
+    board_full = (board.num_empty_points() == 0)
     if game_end:
         #return 1 if winner == board.current_player else -1
         return winner
@@ -69,13 +64,16 @@ class GomokuSimulationPlayer(object):
         res=game_result(board)
         simulation_moves=[]
         while(res is None):
-            _ , candidate_moves = self.policy_moves(board, board.current_player)
-            playout_move=random.choice(candidate_moves)
+            if self.playout_policy=='random':
+                playout_move=board.random_empty_point()
+            else:
+                _ , candidate_moves = self.policy_moves(board, board.current_player)
+                playout_move=random.choice(candidate_moves)
             play_move(board, playout_move, board.current_player)
             simulation_moves.append(playout_move)
             res=game_result(board)
-        for m in simulation_moves[::-1]:
-            undo(board, m)
+        for _ in simulation_moves:
+            board.undo_move()
         if res == color_to_play:
             return 1.0
         elif res == 'draw':
@@ -99,7 +97,7 @@ class GomokuSimulationPlayer(object):
                 play_move(board, move, toplay)
                 res=game_result(board)
                 if res == toplay:
-                    undo(board, move)
+                    board.undo_move()
                     #This move is a immediate win
                     self.best_move=move
                     return move
@@ -111,7 +109,7 @@ class GomokuSimulationPlayer(object):
                     best_result=win_rate
                     best_move=move
                     self.best_move=best_move
-                undo(board, move)
+                board.undo_move()
         assert(best_move is not None)
         return best_move
 
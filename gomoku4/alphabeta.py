@@ -1,91 +1,337 @@
 from board_util import GoBoardUtil, BLACK, WHITE, EMPTY, BORDER, PASS
+from transposition import TranspositionTable, EXACT, LOWER, UPPER, \
+                          DEPTH, FLAG, SCORE, MOVE
 #from profilehooks import profile
 
-START_DEPTH = 2
-
 INFINITY = 10000000000
 
-def undo(board,move):
-    board.board[move]=EMPTY
-    board.current_player=GoBoardUtil.opponent(board.current_player)
+"""
+Transposition table shared by all searches of this process.
+Entries are keyed by the full position hash, so they stay valid
+from one move to the next.
+"""
+tt = TranspositionTable()
 
 def game_end(board):
     game_end, winner = board.check_game_end_gomoku()
-    moves = board.get_empty_points()
-    board_full = (len(moves) == 0)
+    board_full = (board.num_empty_points() == 0)
     if game_end:
         return INFINITY if winner == board.current_player else -INFINITY
     if board_full:
         return 0
     return None
 
+"""
+Tiers of order_moves
+"""
+WIN = 0
+BLOCK = 1
+FOUR = 2
+QUIET = 3
+
+"""
+Moves that are not next to any stone are searched after all others,
+or not at all if PRUNE_FAR_MOVES is True. The GTP command prune_far
+switches it.
+"""
+PRUNE_FAR_MOVES = False
+
+"""
+History heuristic: per color, a score for each point that caused a
+beta cutoff, weighted by the remaining depth.
+Killer moves: the last two cutoff moves at each ply, where the ply is
+the number of moves played on the board.
+Both are kept from one search to the next.
+"""
+history = {BLACK: {}, WHITE: {}}
+killers = {}
+
+"""
+Number of alphabeta nodes visited by the last solve, and the deepest
+depth it completed
+"""
+nodes = 0
+depth = None
+
+"""
+Deadline of the running solve, None without a time limit. It is polled
+at every node; once it has expired stopped is set, and every node
+returns at once without storing its score, so the unfinished depth is
+discarded.
+"""
+current_deadline = None
+stopped = False
+
+def out_of_time():
+    global stopped
+    if not stopped and current_deadline is not None \
+       and current_deadline.expired():
+        stopped = True
+    return stopped
+
+def reset_search_state():
+    """
+    Forget the transposition table, history and killer moves, so that
+    the next solve does not depend on the searches before it
+    """
+    tt.clear()
+    for score in history.values():
+        score.clear()
+    killers.clear()
+
+def search_stats():
+    return "depth {} nodes {} {}".format(depth, nodes, tt.stats())
+
+def order_moves(board, ttMove):
+    """
+    Return (tier, moves): the candidate moves of the position in search
+    order, and the tier of the first move.
+    1. WIN: a winning move. Only the first one is returned.
+    2. BLOCK: points where the opponent would win. Only these are
+       returned, any other move loses.
+    3. FOUR: moves that make an open four
+    4. moves next to a stone: the transposition table move, then
+       killer moves, then by history score
+    5. all other moves, unless PRUNE_FAR_MOVES
+    If no stone is on the board all moves are returned.
+    """
+    color=board.current_player
+    wins=board.immediate_wins(color)
+    if wins:
+        return WIN,[min(wins)]
+    blocks=board.must_blocks(color)
+    if blocks:
+        return BLOCK,sorted(blocks)
+    fours=board.open_three_points(color)
+    near=[]
+    far=[]
+    for m in board.get_empty_points():
+        if m in fours:
+            continue
+        if board.is_adjacent_to_stone(m):
+            near.append(m)
+        else:
+            # a line through m has no stones next to m
+            far.append(m)
+    fours=sorted(fours)
+    score=history[color]
+    near.sort(key=lambda m: score.get(m, 0), reverse=True)
+    for killer in reversed(killers.get(len(board.moves), ())):
+        tt_move_first(board, near, killer)
+    tt_move_first(board, near, ttMove)
+    moves=fours+near
+    if not moves or not PRUNE_FAR_MOVES:
+        moves+=far
+    return (FOUR if fours else QUIET),moves
+
+def record_cutoff(board, move, d):
+    """
+    Update history and killers with a quiet move that caused a cutoff
+    """
+    score=history[board.current_player]
+    score[move]=score.get(move, 0) + d * d
+    ply=len(board.moves)
+    killer=killers.get(ply, [])
+    if move not in killer:
+        killers[ply]=[move]+killer[:1]
+
+def tt_store(key, d, alphaOrig, beta, value, move):
+    if value <= alphaOrig:
+        flag = UPPER
+    elif value >= beta:
+        flag = LOWER
+    else:
+        flag = EXACT
+    tt.store(key, d, flag, value, move)
+
+def tt_move_first(board, moves, ttMove):
+    """
+    Move the stored best move of the position to the front of moves
+    """
+    if ttMove is not None and ttMove in moves:
+        moves.remove(ttMove)
+        moves.insert(0, ttMove)
+    return moves
+
 def alphabeta(board,alpha,beta, d):
+    global nodes
+    nodes+=1
+    if out_of_time():
+        return 0
     #print(GoBoardUtil.get_twoD_board(board),alpha,beta)
     result=game_end(board)
     if (result!=None):
         return result
-    solvePoint=board.list_solve_point()
-    if solvePoint:
-        #print(solvePoint[0])
-        board.play_move_gomoku(solvePoint[0],board.current_player)
+    key=board.hash
+    entry=tt.probe(key)
+    ttMove=None
+    if entry is not None:
+        ttMove=entry[MOVE]
+        if entry[DEPTH]>=d:
+            score,flag=entry[SCORE],entry[FLAG]
+            if flag==EXACT or (flag==LOWER and score>=beta) \
+               or (flag==UPPER and score<=alpha):
+                tt.cutoffs+=1
+                return min(max(score,alpha),beta)
+    alphaOrig=alpha
+    bestMove=ttMove
+    tier,moves=order_moves(board, ttMove)
+    if (d <= 0):
+        if tier==QUIET:
+            score=board.get_heuristic_score()
+            tt.store(key, d, EXACT, score, None)
+            return score
+        # forced moves are searched past the depth limit
+        moves=moves[:1]
+    for m in moves:
+        board.play_move_gomoku(m,board.current_player)
         result=-alphabeta(board,-beta,-alpha, d - 1)
+        board.undo_move()
+        if stopped:
+            return 0
         if(result>alpha):
             alpha=result
-        undo(board,solvePoint[0])
+            bestMove=m
         if(result>=beta):
-            return beta
-    else:
-        if (d <= 0):
-            return board.get_heuristic_score()
-        else:
-            for m in GoBoardUtil.generate_legal_moves_gomoku(board):
-                board.play_move_gomoku(m,board.current_player)
-                result=-alphabeta(board,-beta,-alpha, d - 1)
-                if(result>alpha):
-                    alpha=result
-                undo(board,m)
-                if(result>=beta):
-                    return beta
+            alpha=beta
+            bestMove=m
+            if tier==QUIET:
+                record_cutoff(board, m, d)
+            break
+    tt_store(key, d, alphaOrig, beta, alpha, bestMove)
     return alpha
 
+def search_root(board, moves, d):
+    """
+    Search each of the root moves, in order, with d more plies after it.
+    Stops at the first winning move, or when the deadline has expired.
+    Returns (bestScore, bestMove, scores) where scores[i] is the score of
+    moves[i], or -INFINITY for moves not searched after a win. After a
+    stop only the moves searched to the end are counted.
+    """
+    alpha,beta=-INFINITY,INFINITY
+    bestScore,bestMove=-INFINITY,moves[0]
+    scores=[-INFINITY]*len(moves)
+    for i,m in enumerate(moves):
+        board.play_move_gomoku(m,board.current_player)
+        result=-alphabeta(board,-beta,-alpha, d)
+        board.undo_move()
+        if stopped:
+            break
+        scores[i]=result
+        if(result>alpha):
+            alpha=result
+            bestScore,bestMove=result,m
+        if(result==INFINITY):
+            break
+    return bestScore,bestMove,scores
+
 #@profile
+def iterative_deepening(board, deadline=None, maxDepth=None):
+    """
+    Iterative deepening: search the root moves with 0, 1, 2, ... more plies,
+    until the result is proven, maxDepth is completed or the deadline
+    has expired. A depth interrupted by the deadline is discarded, except
+    for a root move proven to win, so the result is that of the deepest
+    completed depth.
+    Depth 0 searches the moves in the order of order_moves, each later
+    depth searches the best move of the previous one first, then the other
+    moves by their previous scores. Inside the tree the principal variation
+    is tried first through the moves stored in the transposition table.
+    If the table has an exact result for the position, as after pondering,
+    the search starts again at its depth instead of at depth 0.
+    The game must not be over.
+    Returns (score, move, proven): the score of move for the player to
+    move, and whether that score is exact. Before depth 0 completes the
+    score is None and move is the first move of order_moves. With
+    PRUNE_FAR_MOVES no score is proven, as the far moves of both sides
+    were left out.
+    """
+    global nodes, depth, current_deadline, stopped
+    nodes,depth=0,None
+    current_deadline,stopped=deadline,False
+    tt.new_search()
+    proven=not PRUNE_FAR_MOVES
+    key=board.hash
+    entry=tt.probe(key)
+    ttMove=None if entry is None else entry[MOVE]
+    tier,moves=order_moves(board, ttMove)
+    if entry is not None and entry[FLAG]!=UPPER \
+       and entry[SCORE]==INFINITY and ttMove in moves:
+        tt.cutoffs+=1
+        return INFINITY,ttMove,proven
+    # never leave the caller without a move, even before depth 0 completes
+    score,move=None,moves[0]
+    d=0
+    if entry is not None and entry[FLAG]==EXACT and ttMove in moves:
+        d=max(0, entry[DEPTH] - 1)
+    while not out_of_time():
+        bestScore,bestMove,scores=search_root(board, moves, d)
+        if(bestScore==INFINITY):
+            tt.store(key, d + 1, EXACT, bestScore, bestMove)
+            depth=d
+            return bestScore,bestMove,proven
+        if stopped:
+            break
+        tt.store(key, d + 1, EXACT, bestScore, bestMove)
+        score,move,depth=bestScore,bestMove,d
+        # with as many plies as empty points every line reaches the end
+        exhaustive=(d + 1 >= board.num_empty_points())
+        if bestScore==-INFINITY or exhaustive:
+            return score,move,proven
+        if maxDepth is not None and d>=maxDepth:
+            break
+        order=sorted(range(len(moves)), key=lambda i: -scores[i])
+        moves=[moves[i] for i in order]
+        d+=1
+    return score,move,False
+
+def predicted_move(board):
+    """
+    The move the last search expects on board: the stored best move of
+    the position, else the first move of order_moves
+    """
+    entry=tt.probe(board.hash)
+    ttMove=None if entry is None else entry[MOVE]
+    tier,moves=order_moves(board, ttMove)
+    return moves[0]
+
+def ponder(board, deadline):
+    """
+    Search on the opponent's time: play the predicted reply on board and
+    search the position after it until deadline expires or is cancelled.
+    The results stay in the transposition table, so if the opponent
+    plays that move the next solve goes on from the depth reached here.
+    search_stats goes on reporting the last solve.
+    Returns the predicted move, or None if the game is over.
+    """
+    global nodes, depth
+    if game_end(board) is not None:
+        return None
+    saved=(nodes, depth, tt.probes, tt.hits, tt.cutoffs, tt.stores,
+           tt.replacements)
+    move=predicted_move(board)
+    board.play_move_gomoku(move,board.current_player)
+    if game_end(board) is None:
+        iterative_deepening(board, deadline)
+    board.undo_move()
+    nodes, depth, tt.probes, tt.hits, tt.cutoffs, tt.stores, \
+        tt.replacements = saved
+    return move
+
 """
-if have winning move, return _,winning_move
-else return have_draw,"NoMove"
+if have winning move, return True,winning_move
+else return have_draw,best_move
+where have_draw is only True if the draw is proven
 """
-def solve(board, sboard):
+def solve(board, deadline=None, maxDepth=None):
     result=game_end(board)
     if (result!=None):
         return result,"First"
-    sboard.set_best_move(-INFINITY, None)
-    alpha,beta=-INFINITY,INFINITY
-    haveDraw=False
-    solvePoint=board.list_solve_point()
-    if solvePoint:
-        #print(solvePoint[0])
-        board.play_move_gomoku(solvePoint[0],board.current_player)
-        result=-alphabeta(board,-beta,-alpha, START_DEPTH)
-        undo(board,solvePoint[0])
-        if(result==INFINITY):
-            return True,solvePoint[0]
-        elif(result==0):
-            haveDraw=True
-    else: 
-        for m in GoBoardUtil.generate_legal_moves_gomoku(board):
-            board.play_move_gomoku(m,board.current_player)
-            result=-alphabeta(board,-beta,-alpha, START_DEPTH)
-            #print(GoBoardUtil.get_twoD_board(board))
-            #print(result)
-            undo(board,m)
-            print(m, result, sboard.get_best_move_score())
-            if(result==INFINITY):
-                return True,m
-            #elif(result==0):
-            #    haveDraw=True
-            elif (result > sboard.get_best_move_score()):
-                sboard.set_best_move(result, m)
-    print(sboard.get_best_move_score(), sboard.get_best_move(), "No move")
-    return haveDraw, PASS
+    score,move,proven=iterative_deepening(board, deadline, maxDepth)
+    if proven and score==INFINITY:
+        return True,move
+    return (proven and score==0),move
 
 
     """
@@ -131,11 +131,7 @@ class GoBoardUtil(object):
         """
         Generate a random move for the game of Gomoku.
         """
-        moves = board.get_empty_points()
-        if len(moves) == 0:
-            return PASS
-        np.random.shuffle(moves)
-        return moves[0]
+        return board.random_empty_point()
 
     @staticmethod       
     def generate_random_move(board, color, use_eye_filter):
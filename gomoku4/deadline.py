@@ -0,0 +1,56 @@
+"""
+deadline.py
+Cooperative time limit for searches.
+
+Searches poll expired() and return their best result so far once it is
+true, instead of being interrupted by a signal. The clock is
+time.monotonic, so limits are kept to a fraction of a second.
+Another thread can end a search early with cancel(), as when a GTP
+command arrives during pondering.
+"""
+
+import time
+
+"""
+Seconds kept back from the time limit for reading the command and
+writing the response
+"""
+IO_RESERVE = 0.15
+
+class Deadline(object):
+
+    def __init__(self, seconds=0, reserve=IO_RESERVE):
+        """
+        A deadline seconds from now, less reserve.
+        seconds <= 0 means there is no time limit.
+        """
+        self.start = time.monotonic()
+        self.cancelled = False
+        if seconds > 0:
+            self.end = self.start + max(0.0, seconds - reserve)
+        else:
+            self.end = None
+
+    def unlimited(self):
+        return self.end is None
+
+    def expired(self):
+        return self.cancelled or \
+               (self.end is not None and time.monotonic() >= self.end)
+
+    def cancel(self):
+        """
+        Make expired() true from now on
+        """
+        self.cancelled = True
+
+    def remaining(self):
+        """
+        Seconds left, or None without a time limit
+        """
+        if self.end is None:
+            return None
+        return max(0.0, self.end - time.monotonic())
+
+    def elapsed(self):
+        return time.monotonic() - self.start
@@ -12,8 +12,9 @@ from board_util import GoBoardUtil, BLACK, WHITE, EMPTY, BORDER, PASS, \
                        MAXSIZE, coord_to_point
 import numpy as np
 import re
-import signal
+import threading
 import alphabeta
+from deadline import Deadline
 
 class GtpConnection():
 
@@ -31,7 +32,6 @@ class GtpConnection():
         self._debug_mode = debug_mode
         self.go_engine = go_engine
         self.board = board
-        signal.signal(signal.SIGALRM, self.handler)
         self.commands = {
             "protocol_version": self.protocol_version_cmd,
             "quit": self.quit_cmd,
@@ -57,8 +57,17 @@ class GtpConnection():
             "solve": self.solve_cmd,
             "list_solve_point": self.list_solve_point_cmd, # below is added for Gomoku3
             "policy": self.set_playout_policy, 
-            "policy_moves": self.display_pattern_moves
+            "policy_moves": self.display_pattern_moves,
+            "scan_patterns": self.scan_patterns_cmd,
+            "tt_memory": self.tt_memory_cmd,
+            "tt_stats": self.tt_stats_cmd,
+            "search_stats": self.search_stats_cmd,
+            "ponder": self.ponder_cmd,
+            "prune_far": self.prune_far_cmd
         }
+        self.pondering=False
+        self.ponder_thread=None
+        self.ponder_deadline=None
         self.timelimit=55
 
         # used for argument checking
@@ -67,11 +76,15 @@ class GtpConnection():
         self.argmap = {
             "boardsize": (1, 'Usage: boardsize INT'),
             "komi": (1, 'Usage: komi FLOAT'),
+            "timelimit": (1, 'Usage: timelimit SECONDS'),
+            "ponder": (1, 'Usage: ponder {on,off}'),
+            "prune_far": (1, 'Usage: prune_far {on,off}'),
             "known_command": (1, 'Usage: known_command CMD_NAME'),
             "genmove": (1, 'Usage: genmove {w,b}'),
             "play": (2, 'Usage: play {b,w} MOVE'),
             "legal_moves": (1, 'Usage: legal_moves {w,b}'),
-            "policy":(1, 'Usage: set playout policy {random, rule_based}')
+            "policy":(1, 'Usage: set playout policy {random, rule_based}'),
+            "tt_memory": (1, 'Usage: tt_memory MEGABYTES')
         }
     
     def set_playout_policy(self, args):
@@ -88,8 +101,7 @@ class GtpConnection():
             else:
                 self.respond("")
             return
-        all_moves=self.board.get_empty_points()
-        if len(all_moves) == 0:
+        if self.board.num_empty_points() == 0:
             self.respond('')
             return
         moveType, moves=self.go_engine.policy_moves(self.board, color)
@@ -113,8 +125,31 @@ class GtpConnection():
         """
         line = stdin.readline()
         while line:
+            self.stop_pondering()
             self.get_cmd(line)
             line = stdin.readline()
+        self.stop_pondering()
+
+    def start_pondering(self):
+        """
+        Search on the opponent's time, from a copy of the board after our
+        move, until the next command arrives. See alphabeta.ponder.
+        """
+        if not self.pondering:
+            return
+        self.ponder_deadline = Deadline()
+        self.ponder_thread = threading.Thread(
+            target=alphabeta.ponder,
+            args=(self.board.copy(), self.ponder_deadline), daemon=True)
+        self.ponder_thread.start()
+
+    def stop_pondering(self):
+        """ Cancel the pondering search and wait for it to return """
+        if self.ponder_thread is None:
+            return
+        self.ponder_deadline.cancel()
+        self.ponder_thread.join()
+        self.ponder_thread = None
 
     def get_cmd(self, command):
         """
@@ -282,29 +317,46 @@ class GtpConnection():
             self.respond('{}'.format(str(e)))
 
     def timelimit_cmd(self, args):
-        self.timelimit = args[0]
+        """
+        Seconds allowed for genmove and solve, fractions are allowed.
+        0 means no time limit.
+        """
+        try:
+            self.timelimit = float(args[0])
+        except ValueError:
+            self.error('Usage: timelimit SECONDS')
+            return
         self.respond('')
 
-    def handler(self, signum, fram):
-        self.board = self.sboard
-        raise Exception("unknown")
+    def ponder_cmd(self, args):
+        """ Search on the opponent's time after each genmove, on or off """
+        if args[0] not in ('on', 'off'):
+            self.error('Usage: ponder {on,off}')
+            return
+        self.pondering = (args[0] == 'on')
+        self.respond()
+
+    def prune_far_cmd(self, args):
+        """
+        Drop the moves far from all stones from the search, on or off.
+        The transposition table is cleared when the setting changes, as
+        its scores were found with the other one.
+        """
+        if args[0] not in ('on', 'off'):
+            self.error('Usage: prune_far {on,off}')
+            return
+        prune = (args[0] == 'on')
+        if prune != alphabeta.PRUNE_FAR_MOVES:
+            alphabeta.tt.clear()
+        alphabeta.PRUNE_FAR_MOVES = prune
+        self.respond()
 
     def solve_cmd(self, args):
-        try:
-            self.sboard = self.board.copy()
-            signal.alarm(int(self.timelimit)-1)
-            winner,move = self.board.solve()
-            self.board = self.sboard
-            signal.alarm(0)
-            if move != "NoMove":
-                if move == None:
-                    self.respond('{} {}'.format(winner, self.board._point_to_coord(move)))
-                    return 
-                self.respond('{} {}'.format(winner, format_point(point_to_coord(move, self.board.size))))
-                return 
+        winner,move = self.board.solve(Deadline(self.timelimit))
+        if move == "NoMove":
             self.respond('{}'.format(winner))
-        except Exception as e:
-            self.respond('{}'.format(str(e)))
+            return
+        self.respond('{} {}'.format(winner, format_point(point_to_coord(move, self.board.size))))
 
     def genmove_cmd(self, args):
         """
@@ -319,25 +371,11 @@ class GtpConnection():
             else:
                 self.respond("resign")
             return
-        moves = self.board.get_empty_points()
-        board_is_full = (len(moves) == 0)
+        board_is_full = (self.board.num_empty_points() == 0)
         if board_is_full:
             self.respond("pass")
             return
-        move=None
-        try:
-            signal.alarm(int(self.timelimit))
-            self.sboard = self.board.copy()
-            result, move = alphabeta.solve(self.board, self.sboard)
-            #winner, move = GoBoardUtil.solve_gomoku(self.board, color)
-            self.board=self.sboard
-            signal.alarm(0)
-        except Exception as e:
-            move=self.board.get_best_move()
-            if (move == PASS):
-                # TODO: just pick a random move
-                pass
-            print(e)
+        result, move = alphabeta.solve(self.board, Deadline(self.timelimit))
 
         if move == PASS:
             self.respond("pass")
@@ -347,6 +385,7 @@ class GtpConnection():
         if self.board.is_legal_gomoku(move, color):
             self.board.play_move_gomoku(move, color)
             self.respond(move_as_string)
+            self.start_pondering()
         else:
             self.respond("illegal move: {}".format(move_as_string))
 
@@ -406,8 +445,7 @@ class GtpConnection():
     
     def gogui_rules_final_result_cmd(self, args):
         game_end, winner = self.board.check_game_end_gomoku()
-        moves = self.board.get_empty_points()
-        board_full = (len(moves) == 0)
+        board_full = (self.board.num_empty_points() == 0)
         if board_full and not game_end:
             self.respond("draw")
             return
@@ -429,6 +467,39 @@ class GtpConnection():
     def list_solve_point_cmd(self, args):
         self.respond(self.board.list_solve_point())
 
+    def scan_patterns_cmd(self, args):
+        """
+        Classify all windows of the board with the vectorized scan:
+        the pattern move type and its moves, then the wins and 2-move
+        wins of the current player and the opponent
+        """
+        patternMoves, wins = self.board.scan_patterns()
+        if patternMoves is None:
+            moveType, moves = 'Random', []
+        else:
+            moveType, moves = self.go_engine.pattern_list[patternMoves[0]], patternMoves[1]
+        lines = [moveType + ' ' + self._format_points(moves)]
+        for name, points in zip(('wins', 'threats', '2m-wins', '2m-threats'), wins):
+            lines.append(name + ' ' + self._format_points(points))
+        self.respond('\n'.join(line.strip() for line in lines))
+
+    def _format_points(self, points):
+        return ' '.join(sorted(format_point(point_to_coord(p, self.board.size))
+                               for p in points))
+
+    def tt_memory_cmd(self, args):
+        """ Resize the alphabeta transposition table to args[0] megabytes """
+        alphabeta.tt.resize(int(float(args[0]) * 1024 * 1024))
+        self.respond()
+
+    def tt_stats_cmd(self, args):
+        """ Report transposition table usage of the last search """
+        self.respond(alphabeta.tt.stats())
+
+    def search_stats_cmd(self, args):
+        """ Report node count and transposition table usage of the last search """
+        self.respond(alphabeta.search_stats())
+
 def point_to_coord(point, boardsize):
     """
     Transform point given as board array index 
@@ -0,0 +1,123 @@
+"""
+line_codes.py
+Base-4 codes of lines and lookup tables of the string patterns.
+
+A point of the padded board is EMPTY, BLACK, WHITE or BORDER, 0 to 3, so
+the cells c0, c1, ... of a line or window are coded as the integer
+c0 + 4 * c1 + 4**2 * c2 + ...  A window of a line code is a shift and a
+mask away.
+The string patterns stay the source of truth: x is the color of the
+player, o the opponent, . an empty point and B the border. The tables
+translate them to codes for each color once, so no strings are built
+when a window is classified.
+"""
+
+from board_util import GoBoardUtil, EMPTY, BORDER
+import functools
+import itertools
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+def pattern_code(pattern, color):
+    """
+    Return the code of the cells matching pattern, for player color
+    """
+    cell = {'x': color, 'o': GoBoardUtil.opponent(color),
+            '.': EMPTY, 'B': BORDER}
+    code = 0
+    for i, c in enumerate(pattern):
+        code |= cell[c] << (2 * i)
+    return code
+
+def window_mask(length):
+    return (1 << (2 * length)) - 1
+
+def build_lookup(patterns, color):
+    """
+    Return a list indexed by the code of a window, holding the value of
+    the pattern with that code or None. All patterns have the same length.
+    """
+    length = len(next(iter(patterns)))
+    table = [None] * (4 ** length)
+    for pattern, value in patterns.items():
+        table[pattern_code(pattern, color)] = value
+    return table
+
+def build_move_table(patterns, length, margin, color):
+    """
+    Return a dict from the code of a window of length cells to the moves
+    of the patterns found in it, as offsets in the window.
+    patterns maps each pattern to its moves, given as distances back from
+    the last cell of the pattern. Only matches that cover the middle of
+    the window, all but margin cells at each end, are counted.
+    Codes without a match are not in the dict.
+    """
+    table = {}
+    for pattern, distances in patterns.items():
+        n = len(pattern)
+        for start in range(margin + 1):
+            end = start + n
+            if end < length - margin or end > length:
+                continue
+            fixed = pattern_code(pattern, color) << (2 * start)
+            free = [i for i in range(length) if i < start or i >= end]
+            offsets = [end - 1 - dis for dis in distances]
+            for cells in itertools.product(range(4), repeat=len(free)):
+                code = fixed
+                for i, c in zip(free, cells):
+                    code |= c << (2 * i)
+                table.setdefault(code, set()).update(offsets)
+    return {code: tuple(sorted(offsets)) for code, offsets in table.items()}
+
+@functools.lru_cache(maxsize=65536)
+def line_string(code, color):
+    """
+    Return the string of a padded line code for player color,
+    without the border points
+    """
+    rep = {color: 'x', EMPTY: '.', GoBoardUtil.opponent(color): 'o'}
+    chars = []
+    # the border point at the end keeps code nonzero up to the last point
+    while code:
+        cell = code & 3
+        if cell != BORDER:
+            chars.append(rep[cell])
+        code >>= 2
+    return ''.join(chars)
+
+def numpy_move_table(table, length):
+    """
+    Return a move table of build_move_table as a numpy array indexed by
+    window code, holding the move offsets of each code as a bit mask
+    """
+    bits = np.zeros(4 ** length, dtype=np.int32)
+    for code, offsets in table.items():
+        for offset in offsets:
+            bits[code] |= 1 << offset
+    return bits
+
+def grid_windows(grid, length):
+    """
+    Return all windows of length cells of a 2-dimensional array, in the
+    rows, columns, diagonals and anti-diagonals, as an array with one
+    window per row. The windows are strided views of grid until they
+    are stacked.
+    """
+    rows, cols = grid.shape
+    n = length - 1
+    if n >= rows or n >= cols:
+        return np.zeros((0, length), dtype=grid.dtype)
+    sr, sc = grid.strides
+    views = [as_strided(grid, (rows, cols - n, length), (sr, sc, sc)),
+             as_strided(grid, (rows - n, cols, length), (sr, sc, sr)),
+             as_strided(grid, (rows - n, cols - n, length), (sr, sc, sr + sc)),
+             as_strided(grid[:, n:], (rows - n, cols - n, length),
+                        (sr, sc, sr - sc))]
+    return np.concatenate([v.reshape(-1, length) for v in views])
+
+def window_codes(windows):
+    """
+    Return the code of each window of grid_windows
+    """
+    length = windows.shape[1]
+    return windows.astype(np.int64).dot(4 ** np.arange(length, dtype=np.int64))
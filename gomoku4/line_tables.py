@@ -0,0 +1,109 @@
+"""
+line_tables.py
+Precomputed lines and windows of the padded 1-dimensional board.
+
+A line is a maximal run of on-board points in one of the four directions
+(horizontal, vertical and the two diagonals). A window is any run of
+5 or 6 consecutive points of a line.
+The tables depend only on the board size, so they are built once per
+size and shared by all boards of that size.
+"""
+
+from board_util import coord_to_point
+
+class LineTables(object):
+
+    def __init__(self, size):
+        """
+        Build the tables for a board of given size
+
+        lines: tuples of points, in the order rows, columns, diagonals
+            and anti-diagonals. The diagonals of length 5 or more come
+            first, starting from the longest.
+        line_steps: the array step between points of each line
+        padded_lines: each line with the border point before and after it
+        point_lines: for each point a list of (line index, position of
+            the point in the line), one per direction
+        windows5, windows6: tuples of points of all windows
+        point_windows5, point_windows6: for each point the indices of
+            the windows it is part of
+        window5_at, window6_at: for each window the index of its line
+            and the position of its first point in the line
+        """
+        self.size = size
+        NS = size + 1
+        self.NS = NS
+        maxpoint = size * size + 3 * (size + 1)
+
+        def line_from(row, col, drow, dcol):
+            points = []
+            while 1 <= row <= size and 1 <= col <= size:
+                points.append(coord_to_point(row, col, size))
+                row += drow
+                col += dcol
+            return tuple(points)
+
+        lines = []
+        steps = []
+        for row in range(1, size + 1):
+            lines.append(line_from(row, 1, 0, 1))
+            steps.append(1)
+        for col in range(1, size + 1):
+            lines.append(line_from(1, col, 1, 0))
+            steps.append(NS)
+        diagonals = [(1, 1)]
+        for i in range(2, size + 1):
+            diagonals.append((i, 1))
+            diagonals.append((1, i))
+        for row, col in diagonals:
+            lines.append(line_from(row, col, 1, 1))
+            steps.append(NS + 1)
+        anti_diagonals = [(1, size)]
+        for i in range(2, size + 1):
+            anti_diagonals.append((1, size + 1 - i))
+            anti_diagonals.append((i, size))
+        for row, col in anti_diagonals:
+            lines.append(line_from(row, col, 1, -1))
+            steps.append(NS - 1)
+        self.lines = lines
+        self.line_steps = steps
+        self.padded_lines = [(line[0] - step,) + line + (line[-1] + step,)
+                             for line, step in zip(lines, steps)]
+
+        self.point_lines = [[] for _ in range(maxpoint)]
+        for i, line in enumerate(lines):
+            for pos, point in enumerate(line):
+                self.point_lines[point].append((i, pos))
+
+        self.windows5, self.point_windows5, self.window5_at = \
+            self._windows(5, maxpoint)
+        self.windows6, self.point_windows6, self.window6_at = \
+            self._windows(6, maxpoint)
+
+    def _windows(self, length, maxpoint):
+        windows = []
+        at = []
+        point_windows = [[] for _ in range(maxpoint)]
+        for i, line in enumerate(self.lines):
+            for start in range(len(line) - length + 1):
+                window = line[start : start + length]
+                for point in window:
+                    point_windows[point].append(len(windows))
+                windows.append(window)
+                at.append((i, start))
+        return windows, point_windows, at
+
+"""
+Tables built so far, by board size
+"""
+_tables = {}
+
+def get_line_tables(size):
+    """
+    Return the shared LineTables for size, building them on first use
+    """
+    tables = _tables.get(size)
+    if tables is None:
+        tables = LineTables(size)
+        _tables[size] = tables
+    return tables
@@ -10,11 +10,17 @@ The board uses a 1-dimensional representation with padding
 """
 
 import numpy as np
+import random
 from board_util import GoBoardUtil, BLACK, WHITE, EMPTY, BORDER, \
                        PASS, is_black_white, coord_to_point, where1d, \
                        MAXSIZE, NULLPOINT
+from line_tables import get_line_tables
+from line_codes import build_lookup, build_move_table, window_mask, \
+                       line_string, numpy_move_table, grid_windows, \
+                       window_codes
 import alphabeta
 import collections
+import functools
 
 WINNER_SCORE = 100000
 
@@ -50,6 +56,129 @@ threatDict = {
     "..ooo.": (False, 4),
 }
 
+# patterns of get_pattern_moves, by category
+# the moves of a pattern are distances back from its last point
+patternList=[{'xxxx.':{0},'xxx.x':{1},'xx.xx':{2},'x.xxx':{3},'.xxxx':{4}}, #win
+             {'oooo.':{0},'ooo.o':{1},'oo.oo':{2},'o.ooo':{3},'.oooo':{4}}, #block win
+             {'.xxx..':{1},'..xxx.':{4},'.xx.x.':{2},'.x.xx.':{3}}, #make-four
+             {'.ooo..':{1,5},'..ooo.':{0,4},'.oo.o.':{0,2,5},'.o.oo.':{0,3,5}, 'B.ooo..':{0}, '..ooo.B':{6},
+             'x.ooo..':{0}, '..ooo.x':{6} #block-open-four
+             }]
+
+# list_solve_point blocks an open three of the opponent at fewer points
+solvePatternList=patternList[:3]+[{'.ooo..':{1,5},'..ooo.':{0,4},'.oo.o.':{2},'.o.oo.':{3}}]
+
+"""
+Windows classified for each pattern category, as (length, margin).
+Every match of a category covers a window of its bucket (see
+_initialize_window_counts): a 5-window for wins and blocks, a 6-window
+for the threes. The bucket windows are extended by margin points at
+both ends, so that the patterns with a border or stone next to
+the three fit.
+"""
+CATEGORY_WINDOWS = ((5, 0), (5, 0), (6, 0), (8, 1))
+
+def build_category_tables(patternList):
+    """
+    Return for each category of patternList a dict from color to the
+    move table of the category
+    """
+    return [{color: build_move_table(patterns, length, margin, color)
+             for color in (BLACK, WHITE)}
+            for patterns, (length, margin) in zip(patternList, CATEGORY_WINDOWS)]
+
+PATTERN_TABLES = build_category_tables(patternList)
+SOLVE_TABLES = build_category_tables(solvePatternList)
+
+"""
+winDict and threatDict by window code, for each color to play.
+The values are (MyWin, offset of the move in the window).
+"""
+WIN_LOOKUP = {color: build_lookup(dict((s, (mine, s.index(".")))
+                                       for s, mine in winDict.items()), color)
+              for color in (BLACK, WHITE)}
+THREAT_LOOKUP = {color: build_lookup(dict((s, (mine, 5 - back))
+                                          for s, (mine, back) in threatDict.items()), color)
+                 for color in (BLACK, WHITE)}
+MASK5 = window_mask(5)
+MASK6 = window_mask(6)
+
+"""
+Pattern sets of scan_patterns as (patterns, window length, margin): the
+categories of get_pattern_moves, then myWins, theirWins, my2mWins and
+their2mWins of winDetection. The moves of the winDetection patterns are
+distances back from the last point, as in patternList.
+"""
+SCAN_PATTERNS = [(patterns, length, margin) for patterns, (length, margin)
+                 in zip(patternList, CATEGORY_WINDOWS)] + [
+    (dict((s, {4 - s.index(".")}) for s, mine in winDict.items() if mine), 5, 0),
+    (dict((s, {4 - s.index(".")}) for s, mine in winDict.items() if not mine), 5, 0),
+    (dict((s, {back}) for s, (mine, back) in threatDict.items() if mine), 6, 0),
+    (dict((s, {back}) for s, (mine, back) in threatDict.items() if not mine), 6, 0)]
+
+"""
+SCAN_PATTERNS as numpy move tables, for each color to play
+"""
+SCAN_TABLES = [{color: numpy_move_table(build_move_table(patterns, length,
+                                                         margin, color), length)
+                for color in (BLACK, WHITE)}
+               for patterns, length, margin in SCAN_PATTERNS]
+
+@functools.lru_cache(maxsize=65536)
+def heuristic_line_score(string):
+    """
+    Heuristic score of a whole line from the view of player x,
+    where o is the opponent and . an empty point.
+    """
+    score = 0
+    str_len = len(string)
+    for i in range(0, str_len):
+        if (i + 1 < str_len and string[i] == string[i+1]):
+            ours = string[i] == "x"
+            enemy = string[i] == "o"
+            if (ours):
+                score += 10
+            elif (enemy):
+                score -= 10
+            
+            if (i + 2 < str_len and string[i+1] == string[i+2]):
+                if (ours):
+                    score += 100
+                elif (enemy):
+                    score -= 100
+                if (i + 3 < str_len and string[i+2] == string[i+3]):
+                    if (ours):
+                        score += 1000
+                    elif (enemy):
+                        score -= 1000
+        elif (string[i] == "x"):
+            score += 1
+        #elif (string[i] == "o"):
+        #    score -= 1
+
+    return score
+
+@functools.lru_cache(maxsize=65536)
+def line_code_score(code, color):
+    """
+    Return (number of stones of color, heuristic_line_score) of the line
+    with the given padded line code
+    """
+    string = line_string(code, color)
+    return string.count("x"), heuristic_line_score(string)
+
+"""
+Zobrist keys: a random 64-bit number for each (color, point) pair and one
+for white to move. The hash of a position is the XOR of the keys of its
+stones, so it is updated with one XOR per move and per undo.
+The generator is seeded so that hashes are the same in every run.
+"""
+_zobrist_random = random.Random(20190327)
+ZOBRIST_MAXPOINT = MAXSIZE * MAXSIZE + 3 * (MAXSIZE + 1)
+ZOBRIST_STONE = [[_zobrist_random.getrandbits(64) for _ in range(ZOBRIST_MAXPOINT)]
+                 for _ in range(BORDER + 1)]
+ZOBRIST_WHITE_TO_PLAY = _zobrist_random.getrandbits(64)
+
 class SimpleGoBoard(object):
 
     def get_color(self, point):
@@ -95,9 +224,49 @@ class SimpleGoBoard(object):
     def get_empty_points(self):
         """
         Return:
-            The empty points on the board
+            A list of the empty points on the board, in no particular order.
+            The list is a snapshot, callers may play moves while using it.
+        """
+        return list(self._empty_points)
+
+    def num_empty_points(self):
+        """
+        Return:
+            The number of empty points on the board, in O(1)
+        """
+        return len(self._empty_points)
+
+    def random_empty_point(self):
+        """
+        Return:
+            A uniformly random empty point in O(1), or PASS if there is none
+        """
+        if not self._empty_points:
+            return PASS
+        return random.choice(self._empty_points)
+
+    def _initialize_empty_point_set(self):
+        """
+        Build the set of empty points from the board array.
+        The set is an array with swap-remove plus an index from point to
+        position in that array, so add, remove and random choice are O(1).
         """
-        return where1d(self.board == EMPTY)
+        self._empty_points = [int(p) for p in where1d(self.board == EMPTY)]
+        self._empty_index = [-1] * self.maxpoint
+        for i, p in enumerate(self._empty_points):
+            self._empty_index[p] = i
+
+    def _remove_empty_point(self, point):
+        i = self._empty_index[point]
+        last = self._empty_points.pop()
+        if last != point:
+            self._empty_points[i] = last
+            self._empty_index[last] = i
+        self._empty_index[point] = -1
+
+    def _add_empty_point(self, point):
+        self._empty_index[point] = len(self._empty_points)
+        self._empty_points.append(point)
 
     def __init__(self, size):
         """
@@ -121,7 +290,19 @@ class SimpleGoBoard(object):
         self.board = np.full(self.maxpoint, BORDER, dtype = np.int32)
         self.liberty_of = np.full(self.maxpoint, NULLPOINT, dtype = np.int32)
         self._initialize_empty_points(self.board)
+        self._initialize_empty_point_set()
         self._initialize_neighbors()
+        self.line_tables = get_line_tables(size)
+        self._directions = (1, self.NS, self.NS + 1, self.NS - 1)
+        self._adjacent_offsets = (1, -1, self.NS, -self.NS,
+                                  self.NS + 1, -self.NS - 1,
+                                  self.NS - 1, -self.NS + 1)
+        self.winner = None
+        self.winning_move = None
+        self.moves = []
+        self._stone_hash = 0
+        self._initialize_window_counts()
+        self._initialize_line_codes()
         self.best_move = None
         self.best_move_score = -1000000
 
@@ -133,8 +314,29 @@ class SimpleGoBoard(object):
         b.current_player = self.current_player
         assert b.maxpoint == self.maxpoint
         b.board = np.copy(self.board)
+        b._empty_points = list(self._empty_points)
+        b._empty_index = list(self._empty_index)
+        b.winner = self.winner
+        b.winning_move = self.winning_move
+        b.moves = list(self.moves)
+        b._stone_hash = self._stone_hash
+        for color in (BLACK, WHITE):
+            b._count5[color] = list(self._count5[color])
+            b._count6[color] = list(self._count6[color])
+            b._fours[color] = set(self._fours[color])
+            b._threes[color] = set(self._threes[color])
+        b._line_codes = list(self._line_codes)
         return b
 
+    @property
+    def hash(self):
+        """
+        64-bit Zobrist key of the position: the stones plus the side to move
+        """
+        if self.current_player == WHITE:
+            return self._stone_hash ^ ZOBRIST_WHITE_TO_PLAY
+        return self._stone_hash
+
     def row_start(self, row):
         assert row >= 1
         assert row <= self.size
@@ -170,6 +372,103 @@ class SimpleGoBoard(object):
             else:
                 self.neighbors.append(self._on_board_neighbors(point))
         
+    def _initialize_window_counts(self):
+        """
+        Stone counts of each color in every 5- and 6-window of the line
+        tables, and buckets of the windows that make threats:
+        _fours[color]: 5-windows with four stones of color and no
+            opponent stone, the empty point wins for color
+        _threes[color]: 6-windows with three stones of color and no
+            opponent stone, open threes if both ends are empty
+        """
+        t = self.line_tables
+        self._count5 = {BLACK: [0] * len(t.windows5),
+                        WHITE: [0] * len(t.windows5)}
+        self._count6 = {BLACK: [0] * len(t.windows6),
+                        WHITE: [0] * len(t.windows6)}
+        self._fours = {BLACK: set(), WHITE: set()}
+        self._threes = {BLACK: set(), WHITE: set()}
+
+    def _initialize_line_codes(self):
+        """
+        Base-4 code of every padded line of the line tables, see line_codes
+        """
+        self._line_codes = [BORDER | BORDER << (2 * (len(line) - 1))
+                            for line in self.line_tables.padded_lines]
+
+    def _update_line_codes(self, point, value):
+        """
+        Add value to the cell of point in the codes of its lines
+        """
+        codes = self._line_codes
+        # a NumPy value would overflow on lines longer than 15 points
+        value = int(value)
+        for line, pos in self.line_tables.point_lines[point]:
+            # pos + 1 for the border point in front of the line
+            codes[line] += value << (2 * pos + 2)
+
+    def _add_window_counts(self, point, color):
+        """
+        Count a new stone of color on point in all windows through it.
+        Returns True if the stone completes a five.
+        """
+        opp = GoBoardUtil.opponent(color)
+        t = self.line_tables
+        five = False
+        mine, theirs = self._count5[color], self._count5[opp]
+        for w in t.point_windows5[point]:
+            n = mine[w] + 1
+            mine[w] = n
+            if theirs[w] == 0:
+                if n == 4:
+                    self._fours[color].add(w)
+                elif n == 5:
+                    self._fours[color].discard(w)
+                    five = True
+            elif n == 1 and theirs[w] == 4:
+                self._fours[opp].discard(w)
+        mine, theirs = self._count6[color], self._count6[opp]
+        for w in t.point_windows6[point]:
+            n = mine[w] + 1
+            mine[w] = n
+            if theirs[w] == 0:
+                if n == 3:
+                    self._threes[color].add(w)
+                elif n == 4:
+                    self._threes[color].discard(w)
+            elif n == 1 and theirs[w] == 3:
+                self._threes[opp].discard(w)
+        return five
+
+    def _remove_window_counts(self, point, color):
+        """
+        Undo _add_window_counts for the stone of color on point
+        """
+        opp = GoBoardUtil.opponent(color)
+        t = self.line_tables
+        mine, theirs = self._count5[color], self._count5[opp]
+        for w in t.point_windows5[point]:
+            n = mine[w] - 1
+            mine[w] = n
+            if theirs[w] == 0:
+                if n == 4:
+                    self._fours[color].add(w)
+                elif n == 3:
+                    self._fours[color].discard(w)
+            elif n == 0 and theirs[w] == 4:
+                self._fours[opp].add(w)
+        mine, theirs = self._count6[color], self._count6[opp]
+        for w in t.point_windows6[point]:
+            n = mine[w] - 1
+            mine[w] = n
+            if theirs[w] == 0:
+                if n == 3:
+                    self._threes[color].add(w)
+                elif n == 2:
+                    self._threes[color].discard(w)
+            elif n == 0 and theirs[w] == 3:
+                self._threes[opp].add(w)
+
     def is_eye(self, point, color):
         """
         Check if point is a simple eye for color
@@ -384,213 +683,228 @@ class SimpleGoBoard(object):
         assert point != PASS
         if self.board[point] != EMPTY:
             return False
+        self.moves.append((point, self.current_player))
         self.board[point] = color
+        self._remove_empty_point(point)
+        self._stone_hash ^= ZOBRIST_STONE[color][point]
         self.current_player = GoBoardUtil.opponent(color)
+        # only the windows through the new stone can become a five
+        five = self._add_window_counts(point, color)
+        self._update_line_codes(point, color)
+        if self.winner is None and five:
+            self.winner = color
+            self.winning_move = point
         return True
-        
-    def _point_direction_check_connect_gomoko(self, point, shift):
-        """
-        Check if the point has connect5 condition in a direction
-        for the game of Gomoko.
+
+    def undo_move(self):
         """
+            Undo the last move played with play_move_gomoku
+            The move history is a stack: restores the side to move and all
+            state derived from the stones, then returns the undone point
+            """
+        point, previous_player = self.moves.pop()
         color = self.board[point]
-        count = 1
-        d = shift
-        p = point
-        while True:
-            p = p + d
-            if self.board[p] == color:
-                count = count + 1
-                if count == 5:
-                    break
-            else:
-                break
-        d = -d
-        p = point
-        while True:
-            p = p + d
-            if self.board[p] == color:
-                count = count + 1
-                if count == 5:
-                    break
-            else:
-                break
-        assert count <= 5
-        return count == 5
-    
+        assert is_black_white(color)
+        self.board[point] = EMPTY
+        self._add_empty_point(point)
+        self._stone_hash ^= ZOBRIST_STONE[color][point]
+        self._remove_window_counts(point, color)
+        self._update_line_codes(point, -color)
+        self.current_player = previous_player
+        if point == self.winning_move:
+            self.winner = None
+            self.winning_move = None
+        return point
+
+    def push(self, point):
+        """
+            Play point for the player to move, see play_move_gomoku
+            """
+        return self.play_move_gomoku(point, self.current_player)
+
+    def pop(self):
+        """
+            Take back the last move played, see undo_move
+            """
+        return self.undo_move()
+        
     def point_check_game_end_gomoku(self, point):
         """
             Check if the point causes the game end for the game of Gomoko.
+            Uses the stone counts of the five-windows through point.
             """
-        # check horizontal
-        if self._point_direction_check_connect_gomoko(point, 1):
-            return True
-        
-        # check vertical
-        if self._point_direction_check_connect_gomoko(point, self.NS):
-            return True
-        
-        # check y=x
-        if self._point_direction_check_connect_gomoko(point, self.NS + 1):
-            return True
-        
-        # check y=-x
-        if self._point_direction_check_connect_gomoko(point, self.NS - 1):
-            return True
-        
+        counts = self._count5[self.board[point]]
+        for w in self.line_tables.point_windows5[point]:
+            if counts[w] == 5:
+                return True
         return False
-    
+
+    def _category_moves(self, tables, category, color):
+        """
+        Return the set of moves of one pattern category for color to play.
+        Only the windows in the bucket of the category are classified.
+        """
+        t = self.line_tables
+        if category < 2:
+            windows = self._fours[color if category == 0
+                                  else GoBoardUtil.opponent(color)]
+            window_at = t.window5_at
+        else:
+            windows = self._threes[color if category == 2
+                                   else GoBoardUtil.opponent(color)]
+            window_at = t.window6_at
+        length, margin = CATEGORY_WINDOWS[category]
+        table = tables[category][color]
+        mask = window_mask(length)
+        codes = self._line_codes
+        padded_lines = t.padded_lines
+        moves = set()
+        for w in windows:
+            line, start = window_at[w]
+            # start + 1 for the border point in front of the line
+            start += 1 - margin
+            offsets = table.get((codes[line] >> (2 * start)) & mask)
+            if offsets:
+                points = padded_lines[line]
+                for offset in offsets:
+                    moves.add(points[start + offset])
+        return moves
+
+    def immediate_wins(self, color):
+        """
+        Return the set of points where color makes five in a row
+        """
+        return self._category_moves(PATTERN_TABLES, 0, color)
+
+    def must_blocks(self, color):
+        """
+        Return the set of points where the opponent of color makes five
+        in a row, color has to play one of them
+        """
+        return self.immediate_wins(GoBoardUtil.opponent(color))
+
+    def open_three_points(self, color):
+        """
+        Return the set of points where color turns an open three into
+        an open four
+        """
+        return self._category_moves(PATTERN_TABLES, 2, color)
+
+    def is_adjacent_to_stone(self, point):
+        """
+        Check if any of the eight points around point has a stone
+        """
+        for offset in self._adjacent_offsets:
+            if is_black_white(self.board[point + offset]):
+                return True
+        return False
+
     def check_game_end_gomoku(self):
         """
             Check if the game ends for the game of Gomoku.
+            The winner is recorded by play_move_gomoku, so this is O(1).
             """
-        white_points = where1d(self.board == WHITE)
-        black_points = where1d(self.board == BLACK)
-        
-        for point in white_points:
-            if self.point_check_game_end_gomoku(point):
-                return True, WHITE
-    
-        for point in black_points:
-            if self.point_check_game_end_gomoku(point):
-                return True, BLACK
-
+        if self.winner is not None:
+            return True, self.winner
         return False, None
 
-    def solve(self):
-        result, move, drawMove = alphabeta.solve(self)
-        if move=="First":
+    def solve(self, deadline=None):
+        """
+        Solve the position for the player to move, within deadline.
+        Returns (winner, move): winner is 'b', 'w', 'draw' or 'unknown'
+        if the search ran out of time or pruned far moves, and move is
+        the winning or drawing move, or "NoMove".
+        """
+        result=alphabeta.game_end(self)
+        if result is not None:
             if result==0:
-                return 'draw',drawMove
-            else:
-                winner='w' if self.current_player!=WHITE else 'b'
-                return winner,'NoMove'
-        elif move=="NoMove":
-            if result:
-                return 'draw', drawMove
-            else:
-                winner='w' if self.current_player!=WHITE else 'b'
-                return winner, move
-        else:
-            winner='w' if self.current_player==WHITE else 'b'
-            return winner, move
-
-    def check_pattern(self,point,have,direction_x,direction_y,moveSet,patternList,color,flag):
-        for i in range(0,4):
-            if have in patternList[i]:
-                for dis in patternList[i][have]:
-                    moveSet[i].add(point-direction_x*(dis+1)-direction_y*self.NS*(dis+1))
-                #flag[0]=True
-                break
-        if (not (0<= point<len(self.board))) or len(have)==9:
-            return
-#if self.get_color(point)==BORDER or len(have)==7:
-#            return
-        piece=self.get_color(point)
-        if piece==EMPTY:
-            piece='.'
-        elif piece==color:
-            piece='x'
-        elif piece == BORDER:
-            piece='B'
-        else:
-            piece='o'
-        have+=piece
-        #print(GoBoardUtil.format_point(self._point_to_coord(point)),have,self.board[point])
-        self.check_pattern(point+direction_x+direction_y*self.NS,have,direction_x,direction_y,moveSet,patternList,color,flag)
+                return 'draw','NoMove'
+            winner=self.current_player if result>0 \
+                   else GoBoardUtil.opponent(self.current_player)
+            return ('b' if winner==BLACK else 'w'),'NoMove'
+        score,move,proven=alphabeta.iterative_deepening(self, deadline)
+        toPlay='b' if self.current_player==BLACK else 'w'
+        if not proven:
+            return 'unknown','NoMove'
+        if score==alphabeta.INFINITY:
+            return toPlay,move
+        if score==0:
+            return 'draw',move
+        return ('w' if toPlay=='b' else 'b'),'NoMove'
 
     def get_pattern_moves(self):
         """
         1. direct winning point xxxx. x.xxx xx.xx
         2. urgent blocking point xoooo.
         3. wining in 2 step point
+        4. blocking point of an open three of the opponent
+        See patternList
         """
-        moveSet=[set(),set(),set(),set()]
         color=self.current_player
-
-        patternList=[{'xxxx.':{0},'xxx.x':{1},'xx.xx':{2},'x.xxx':{3},'.xxxx':{4}}, #win
-                     {'oooo.':{0},'ooo.o':{1},'oo.oo':{2},'o.ooo':{3},'.oooo':{4}}, #block win
-                     {'.xxx..':{1},'..xxx.':{4},'.xx.x.':{2},'.x.xx.':{3}}, #make-four
-                     {'.ooo..':{1,5},'..ooo.':{0,4},'.oo.o.':{0,2,5},'.o.oo.':{0,3,5}, 'B.ooo..':{0}, '..ooo.B':{6},
-                     'x.ooo..':{0}, '..ooo.x':{6} #block-open-four
-                     }]
-
-        direction_x=[1,0,1,-1]
-        direction_y=[0,1,1,1]
-        flag=[False]
-
-        for point in range(0, len(self.board)):
-            if flag[0]:
-                break
-            for direction in range(0,4):
-                    self.check_pattern(point,'',direction_x[direction],direction_y[direction],moveSet,patternList,color,flag)
-        
-        i=0
-        while i<4 and not bool(moveSet[i]): i+=1
-        if i==4:
-            return None
-        else:
-            return i, list(moveSet[i])
+        for i in range(len(patternList)):
+            moves=self._category_moves(PATTERN_TABLES, i, color)
+            if moves:
+                return i, list(moves)
+        return None
             
     def list_solve_point(self):
         """
         1. direct winning point xxxx. x.xxx xx.xx
         2. urgent blocking point xoooo.
         3. wining in 2 step point
+        4. blocking point of an open three of the opponent
+        See solvePatternList
         """
-        moveSet=[set(),set(),set(),set()]
         color=self.current_player
+        for i in range(len(solvePatternList)):
+            moves=self._category_moves(SOLVE_TABLES, i, color)
+            if moves:
+                return list(moves)
+        return None
 
-        patternList=[{'xxxx.':{0},'xxx.x':{1},'xx.xx':{2},'x.xxx':{3},'.xxxx':{4}},{'oooo.':{0},'ooo.o':{1},'oo.oo':{2},'o.ooo':{3},'.oooo':{4}},{'.xxx..':{1},'..xxx.':{4},'.xx.x.':{2},'.x.xx.':{3}},{'.ooo..':{1,5},'..ooo.':{0,4},'.oo.o.':{2},'.o.oo.':{3}}]
-
-        direction_x=[1,0,1,-1]
-        direction_y=[0,1,1,1]
-        flag=[False]
+    def _grid(self, values, fill):
+        """
+        Return values of the padded board as a 2-dimensional array with a
+        border all around: the rows of the board array, plus the missing
+        border column on the right filled with fill
+        """
+        rows = values[:(self.size + 2) * self.NS].reshape(self.size + 2, self.NS)
+        grid = np.full((self.size + 2, self.size + 2), fill, dtype=values.dtype)
+        grid[:, :self.NS] = rows
+        return grid
 
-        for point in where1d(self.board!=BORDER):
-            if flag[0]:
+    def scan_patterns(self):
+        """
+        Classify all windows of the board in one vectorized pass.
+        Returns (get_pattern_moves(), winDetection()) of the current
+        player. The lists of winDetection are sorted and without
+        duplicates. If there is a win only myWins is returned, as in
+        winDetection, but with all winning points instead of the first.
+        """
+        color = self.current_player
+        grid = self._grid(self.board, BORDER)
+        points = self._grid(np.arange(self.maxpoint, dtype=np.int32), NULLPOINT)
+        windows = {}
+        found = []
+        for (patterns, length, margin), tables in zip(SCAN_PATTERNS, SCAN_TABLES):
+            if length not in windows:
+                windows[length] = (grid_windows(points, length),
+                                   window_codes(grid_windows(grid, length)))
+            windowPoints, codes = windows[length]
+            bits = tables[color][codes]
+            moves = set()
+            for offset in range(length):
+                moves.update(windowPoints[(bits >> offset) & 1 == 1, offset].tolist())
+            found.append(sorted(moves))
+        patternMoves = None
+        for i in range(len(patternList)):
+            if found[i]:
+                patternMoves = (i, found[i])
                 break
-            for direction in range(0,4):
-                    self.check_pattern(point,'',direction_x[direction],direction_y[direction],moveSet,patternList,color,flag)
-        
-        i=0
-        while i<4 and not bool(moveSet[i]):
-            i+=1
-        if i==4:
-            return None
-        else:
-            return list(moveSet[i])
-
-    def getPointRep(self, cp, point):
-        value = self.board[point]
-        if (value == cp):
-            return "x"
-        elif (value == EMPTY):
-            return "."
-        elif (value == BORDER):
-            return "#"
-        return "o"
-
-    # dict to look up, winStr, player's list, opponent's list, point to add
-    def checkThreat(self, d, s, cpList, opList, p, step):
-        if s in d:
-            #print("found threat", s)
-            threat = d[s]
-            if threat[0]:
-                cpList.append(p - (threat[1] * step))
-            else:
-                opList.append(p - (threat[1] * step))
-
-    # dict to look up, winStr, player's list, opponent's list, point to add
-    def checkWin(self, d, s, cpList, opList, p, step):
-        if s in d:
-            #print("found win", s)
-            p = p + (s.index(".")-4)*step
-            if d[s]:
-                cpList.append(p)
-                return True
-            else:
-                opList.append(p)
+        myWins, theirWins, my2mWins, their2mWins = found[len(patternList):]
+        if myWins:
+            return patternMoves, (myWins, [], [], [])
+        return patternMoves, (myWins, theirWins, my2mWins, their2mWins)
 
     # threat = opponent's win
     # returns ([wins], [win threat], [2m wins], [2m win threats])
@@ -600,192 +914,63 @@ class SimpleGoBoard(object):
         my2mWins = []
         their2mWins = []
 
-        size = self.size
-        startPoint = size + 2
-
-        points = where1d(self.board == self.current_player)
+        cp = self.current_player
+        winLookup = WIN_LOOKUP[cp]
+        threatLookup = THREAT_LOOKUP[cp]
+        codes = self._line_codes
 
-        #print("Horizontal")
-        # horizontal checks
-        for rowStart in range(startPoint, startPoint + size*size + 1, size+1):
-            winStr = ""
-            for point in range(rowStart, rowStart + size):
-                winStr += self.getPointRep(self.current_player, point)
+        # rows, columns, diagonals, anti-diagonals
+        for i, line in enumerate(self.line_tables.lines):
+            if len(line) < 5:
+                continue
+            # drop the border point in front of the line
+            code = codes[i] >> 2
+            for end in range(5, len(line) + 1):
                 # check 2-move wins
-                if len(winStr) == 6:
-                    self.checkThreat(threatDict, winStr, my2mWins, their2mWins, point, 1)
-                    # reduce the string to a 5-long string
-                    winStr = winStr[1:]
-
+                if end >= 6:
+                    threat = threatLookup[(code >> (2 * (end - 6))) & MASK6]
+                    if threat is not None:
+                        p = line[end - 6 + threat[1]]
+                        if threat[0]:
+                            my2mWins.append(p)
+                        else:
+                            their2mWins.append(p)
                 # check for 1-move wins
-                if len(winStr) == 5:
-                    if self.checkWin(winDict, winStr, myWins, theirWins, point, 1):
-                        # return early if we found a win, because we can just play that
-                        return myWins, [], [], []
-
-        #print("Vertical")
-        # vertical checks
-        for colStart in range(startPoint, startPoint + size):
-            winStr = ""
-            for point in range(colStart, colStart + (size+1)*(size-1) + 1, size+1):
-                winStr += self.getPointRep(self.current_player, point)
-                if len(winStr) == 6:
-                    self.checkThreat(threatDict, winStr, my2mWins, their2mWins, point, size+1)
-                    winStr = winStr[1:]
-                if len(winStr) == 5:
-                    if self.checkWin(winDict, winStr, myWins, theirWins, point, size+1):
-                        # return early if we found a win, because we can just play that
-                        return myWins, [], [], []
-
-        # diagonal I
-        #print("Diag I")
-        exists = size - 5
-        checkRight = startPoint + 1
-        checkDown = startPoint + size + 1
-        dIStarts = [startPoint]
-        for i in range(0, exists):
-            dIStarts.append(checkDown)
-            dIStarts.append(checkRight)
-            checkRight += 1
-            checkDown += size+1
-        dSize = size
-        reduceDSize = True
-        for start in dIStarts:
-            point = start
-            winStr = ""
-            for i in range(0, dSize):
-                winStr += self.getPointRep(self.current_player, point)
-                if len(winStr) == 6:
-                    self.checkThreat(threatDict, winStr, my2mWins, their2mWins, point, size+2)
-                    winStr = winStr[1:]
-                if len(winStr) == 5:
-                    #print(winStr)
-                    if self.checkWin(winDict, winStr, myWins, theirWins, point, size+2):
-                        # return early if we found a win, because we can just play that
-                        return myWins, [], [], []
-
-                point += size+2
-            if reduceDSize:
-                dSize -= 1
-            reduceDSize = not reduceDSize
-
-        # diagonal II
-        #print("diag II")
-        checkLeft = startPoint + (size-1) - 1
-        checkDown = startPoint + (size-1) + (size+1)
-        dIIStarts = [startPoint + size - 1]
-        exists = size - 5
-        for i in range(0, exists):
-            dIIStarts.append(checkLeft)
-            dIIStarts.append(checkDown)
-            checkLeft -= 1
-            checkDown += size+1
-        dSize = size
-        reduceDSize = True
-        for start in dIIStarts:
-            point = start
-            winStr = ""
-            for i in range(0, dSize):
-                winStr += self.getPointRep(self.current_player, point)
-                if len(winStr) == 6:
-                    self.checkThreat(threatDict, winStr, my2mWins, their2mWins, point, size)
-                    winStr = winStr[1:]
-                if len(winStr) == 5:
-                    #print(winStr)
-                    if self.checkWin(winDict, winStr, myWins, theirWins, point, size):
+                win = winLookup[(code >> (2 * (end - 5))) & MASK5]
+                if win is not None:
+                    p = line[end - 5 + win[1]]
+                    if win[0]:
+                        myWins.append(p)
                         # return early if we found a win, because we can just play that
                         return myWins, [], [], []
-
-                point += size
-            if reduceDSize:
-                dSize -= 1
-            reduceDSize = not reduceDSize
+                    theirWins.append(p)
 
         return myWins, theirWins, my2mWins, their2mWins
 
-    def _point_direction_check_connect_gomoko_heur(self, point, shift):
+    def point_check_game_end_gomoku_heur(self, point):
+        """
+        Sum of the heuristic scores of the four lines through point,
+        from the view of the stone on point
+        """
         color = self.board[point]
-        opp = GoBoardUtil.opponent(color)
-        d = shift
-        p = point
-        right_str = "x"
-        
-        # TODO: optimize
-        while True:
-            p = p + d
-            pt = self.board[p]
-            if pt == color:
-                right_str += "x"
-            elif (pt == EMPTY):
-                right_str += "."
-            elif (pt == opp):
-                right_str += "o"
-            else:
-                break
-        d = -d
-        p = point
-        left_str = ""
-        while True:
-            p = p + d
-            pt = self.board[p]
-            if pt == color:
-                left_str += "x"
-            elif (pt == EMPTY):
-                left_str += "."
-            elif (pt == opp):
-                left_str += "o"
-            else:
-                break
-        
-        string = left_str[::-1] + right_str
-        
+        codes = self._line_codes
         score = 0
-        str_len = len(string)
-        for i in range(0, str_len):
-            if (i + 1 < str_len and string[i] == string[i+1]):
-                ours = string[i] == "x"
-                enemy = string[i] == "o"
-                if (ours):
-                    score += 10
-                elif (enemy):
-                    score -= 10
-                
-                if (i + 2 < str_len and string[i+1] == string[i+2]):
-                    if (ours):
-                        score += 100
-                    elif (enemy):
-                        score -= 100
-                    if (i + 3 < str_len and string[i+2] == string[i+3]):
-                        if (ours):
-                            score += 1000
-                        elif (enemy):
-                            score -= 1000
-            elif (string[i] == "x"):
-                score += 1
-            #elif (string[i] == "o"):
-            #    score -= 1
-
+        for i, _ in self.line_tables.point_lines[point]:
+            score += line_code_score(codes[i], color)[1]
         return score
     
-    def point_check_game_end_gomoku_heur(self, point):
-        return (self._point_direction_check_connect_gomoko_heur(point, 1)) \
-            + (self._point_direction_check_connect_gomoko_heur(point, self.NS)) \
-            + (self._point_direction_check_connect_gomoko_heur(point, self.NS + 1)) \
-            + (self._point_direction_check_connect_gomoko_heur(point, self.NS - 1)) \
-    
     def get_heuristic_score(self):
+        """
+        Sum of point_check_game_end_gomoku_heur over the stones of the
+        current player. A line scores once for each such stone on it.
+        """
         score = 0
+        color = self.current_player
         
         # TODO: use a transposition table here
-        current_points = where1d(self.board == self.current_player)
-        #enemy_points = where1d(self.board == GoBoardUtil.opponent(self.current_player))
-        
-        for point in current_points:
-            score += self.point_check_game_end_gomoku_heur(point)
-    
-        #for point in enemy_points:
-        #    score -= self.point_check_game_end_gomoku_heur(point)
-        
+        for code in self._line_codes:
+            count, lineScore = line_code_score(code, color)
+            score += count * lineScore
         
         return score
         
@@ -820,12 +1005,10 @@ class SimpleGoBoard(object):
                 return -1, theirWins[0] # cannot block their two guaranteed win moves
             # must block this point
             point = theirWins[0]
-            self.board[point] = self.current_player
-            self.current_player = GoBoardUtil.opponent(self.current_player)
+            self.play_move_gomoku(point, self.current_player)
             result = self.negaAB(-beta, -alpha, d-1, point)
             v = -result[0]
-            self.current_player = GoBoardUtil.opponent(self.current_player)
-            self.board[point] = EMPTY
+            self.undo_move()
             return v, point
         if len(my2mWins) > 0:
             return 1, my2mWins[0]
@@ -834,38 +1017,29 @@ class SimpleGoBoard(object):
         elif len(their2mWins) == 1:
             # must block this point
             point = their2mWins[0]
-            self.board[point] = self.current_player
-            self.current_player = GoBoardUtil.opponent(self.current_player)
+            self.play_move_gomoku(point, self.current_player)
             result = self.negaAB(-beta, -alpha, d-1, point)
             v = -result[0]
-            self.current_player = GoBoardUtil.opponent(self.current_player)
-            self.board[point] = EMPTY
+            self.undo_move()
             return v, point
             
         while (len(empty_points) != 0):
             point = empty_points[-1] # O(1) operation
             empty_points = empty_points[:-1]
-            self.board[point] = self.current_player
-            bstr = ""
-            for i in range(len(self.board)):
-                if (i % (self.size+1) == 0): bstr += "\n"
-                bstr += self.getPointRep(self.current_player, i)
-            #print(bstr)
-            
-            if self.point_check_game_end_gomoku(point): # state.IsTerminal()
+            # also switches the current player
+            self.play_move_gomoku(point, self.current_player)
+
+            if self.winner is not None: # state.IsTerminal()
                 #print("player", self.current_player, "won", point)
-                self.board[point] = EMPTY
+                self.undo_move()
                 return 1, point
 
-            # switch current player
-            self.current_player = GoBoardUtil.opponent(self.current_player)
             result = self.negaAB(-beta, -alpha, d-1, point)
             v = -result[0]
             if (v > alpha): alpha = v
-            self.current_player = GoBoardUtil.opponent(self.current_player)
 
             # set the current player back and restore the empty point
-            self.board[point] = EMPTY
+            self.undo_move()
 
             if (v >= beta): return beta, point
         return alpha, point
@@ -0,0 +1,132 @@
+"""
+transposition.py
+Bounded transposition table for the alphabeta search.
+
+Positions are keyed by the Zobrist hash of SimpleGoBoard (board.hash).
+The table is a fixed number of buckets of two entries each:
+- slot 0 is depth-preferred: it is only replaced by a search of at least
+  the same depth, or when its entry is left over from an earlier search
+- slot 1 is always replaced
+The number of buckets is derived from a memory cap in bytes.
+"""
+
+"""
+Bound types of a stored score
+"""
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+"""
+Field indices of an entry tuple (key, depth, flag, score, move, age)
+"""
+KEY = 0
+DEPTH = 1
+FLAG = 2
+SCORE = 3
+MOVE = 4
+AGE = 5
+
+"""
+Rough size of one stored entry: the entry tuple, its 64-bit key
+and the list slot pointing to it.
+"""
+ENTRY_BYTES = 160
+
+DEFAULT_MEMORY = 32 * 1024 * 1024
+
+class TranspositionTable(object):
+
+    def __init__(self, memory=DEFAULT_MEMORY):
+        """
+        Creates an empty table using at most about memory bytes
+        """
+        self.resize(memory)
+
+    def resize(self, memory):
+        """
+        Drop all entries and size the table for a memory cap in bytes.
+        The number of buckets is the largest power of two that fits.
+        """
+        num_buckets = 1
+        while num_buckets * 4 * ENTRY_BYTES <= memory:
+            num_buckets *= 2
+        self.memory = memory
+        self.num_buckets = num_buckets
+        self._mask = num_buckets - 1
+        self.clear()
+
+    def clear(self):
+        self.slots = [None] * (2 * self.num_buckets)
+        self.age = 0
+        self.used = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.probes = 0
+        self.hits = 0
+        self.cutoffs = 0
+        self.stores = 0
+        self.replacements = 0
+
+    def new_search(self):
+        """
+        Start a new search: entries of earlier searches become replaceable
+        in the depth-preferred slot, and the statistics restart.
+        """
+        self.age += 1
+        self.reset_stats()
+
+    def capacity(self):
+        return len(self.slots)
+
+    def probe(self, key):
+        """
+        Return the entry tuple stored for key, or None
+        """
+        self.probes += 1
+        i = (key & self._mask) << 1
+        entry = self.slots[i]
+        if entry is not None and entry[KEY] == key:
+            self.hits += 1
+            return entry
+        entry = self.slots[i + 1]
+        if entry is not None and entry[KEY] == key:
+            self.hits += 1
+            return entry
+        return None
+
+    def store(self, key, depth, flag, score, move):
+        self.stores += 1
+        i = (key & self._mask) << 1
+        entry = (key, depth, flag, score, move, self.age)
+        deep = self.slots[i]
+        if deep is None or deep[KEY] == key or depth >= deep[DEPTH] \
+           or deep[AGE] != self.age:
+            self._replace(i, entry)
+            other = self.slots[i + 1]
+            if other is not None and other[KEY] == key:
+                # keep a single entry per key
+                self.slots[i + 1] = None
+                self.used -= 1
+        else:
+            self._replace(i + 1, entry)
+
+    def _replace(self, i, entry):
+        old = self.slots[i]
+        if old is None:
+            self.used += 1
+        elif old[KEY] != entry[KEY]:
+            self.replacements += 1
+        self.slots[i] = entry
+
+    def stats(self):
+        """
+        Return a one line summary of the table usage in the current search
+        """
+        hit_rate = self.hits / self.probes if self.probes else 0.0
+        return "entries {}/{} memory {}MB probes {} hits {} ({:.1%}) " \
+               "cutoffs {} stores {} replacements {}".format(
+                   self.used, self.capacity(), self.memory // (1024 * 1024),
+                   self.probes, self.hits, hit_rate, self.cutoffs,
+                   self.stores, self.replacements)
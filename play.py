@@ -1,105 +1,553 @@
+"""
+play.py
+Tournament between two GTP players, with games played in parallel.
+
+Every game runs in a worker of a process pool and is judged in the
+worker by a Referee, on the board of random_player. Each worker keeps
+its two player processes, started with pexpect, from one game to the
+next and resets them with clear_board; a player that timed out or
+played an illegal move is restarted. Player 1 plays black in the even
+numbered games and white in the odd ones. The players think on the
+wall clock, so the number of concurrent games should not be more than
+the number of cores. Players that know the workers command share out
+the cores: each is set to cores // concurrency playout workers, as only
+one of the two players of a game thinks at a time.
+
+With --sprt ELO0 ELO1 the tournament is a sequential probability ratio
+test: it stops as soon as player 1 is shown to be ELO1 stronger than
+player 2, or no more than ELO0, with error rates alpha and beta. -n is
+then the largest number of games. Games still being played when the
+test ends are stopped before their next move and not counted. At the
+end of the tournament every worker sends quit to its players.
+
+Usage: python3 play.py [-n GAMES] [-j CONCURRENCY] [-t TIMELIMIT]
+                       [--player1 PATH] [--player2 PATH] [--fresh]
+                       [--sprt ELO0 ELO1] [--alpha A] [--beta B]
+"""
+import argparse
+import bisect
+import math
+import multiprocessing
+import os
+import sys
+import threading
+import time
 import pexpect
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'random_player'))
+from board_util import BLACK, WHITE, PASS, coord_to_point
+from simple_board import SimpleGoBoard
+from gtp_connection import move_to_coord
+
 player1='gomoku4/Gomoku4.py'
 player2='random_player/Gomoku2.py'
-
-win1=0
-win2=0
-numTimeout=0
-draw=0
 timeout=2
 
+"""
+Seconds a player may take beyond the time limit before its genmove
+counts as a timeout and loses the game. Moves within the margin are
+still reported as over the limit, see latencyReport.
+"""
+TIMEOUT_MARGIN = 1
+
+"""
+Seconds a player may take to start, or to set up a new game
+"""
+SETUP_TIMEOUT = 30
+
+"""
+Upper edges of the move latency histogram, as fractions of the time
+limit. A last bin holds the moves over the limit.
+"""
+LATENCY_BINS = (0.25, 0.5, 0.75, 0.9, 1.0)
+
+"""
+Results of a game
+"""
+DRAW = 0
+BLACK_WIN = 1
+WHITE_WIN = 2
+
+"""
+Normal quantile of the two-sided 95% confidence interval of the Elo
+"""
+CONFIDENCE_Z = 1.96
+
+"""
+Games before the SPRT can stop: the variance of fewer games is too
+uncertain for the normal approximation of the scores, and stopping on
+it would more than double the error rates
+"""
+SPRT_MIN_GAMES = 20
+
+"""
+Decisions of the SPRT
+"""
+H0 = 'H0'
+H1 = 'H1'
+
+def eloToScore(elo):
+    """
+    Expected score of a player elo points stronger than its opponent
+    """
+    return 1 / (1 + 10 ** (-elo / 400))
+
+def scoreToElo(score):
+    if score <= 0:
+        return -math.inf
+    if score >= 1:
+        return math.inf
+    return 400 * math.log10(score / (1 - score))
+
+def sprtBounds(alpha, beta):
+    """
+    Log likelihood ratio bounds (lower, upper) of the SPRT: below lower
+    H0 is accepted, above upper H1
+    """
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+class Referee(object):
+    """
+    Judges a game in process: checks that each move is on an empty
+    point, and whether it makes five in a row or fills the board.
+    Only the lines through the last move are checked.
+    """
+    def __init__(self, size=7):
+        self.board=SimpleGoBoard(size)
+
+    def play(self, color, move):
+        """
+        Play move, a GTP point, for color 'b' or 'w'.
+        Returns None while the game goes on, else DRAW, BLACK_WIN or
+        WHITE_WIN. Raises ValueError for an illegal move.
+        """
+        coord=move_to_coord(move, self.board.size)
+        if coord==PASS:
+            raise ValueError("pass before the end of the game")
+        point=coord_to_point(coord[0], coord[1], self.board.size)
+        toPlay=BLACK if color=='b' else WHITE
+        if not self.board.is_legal_gomoku(point, toPlay):
+            raise ValueError("illegal move: {} occupied".format(move))
+        self.board.play_move_gomoku(point, toPlay)
+        if self.board.point_check_game_end_gomoku(point):
+            return BLACK_WIN if color=='b' else WHITE_WIN
+        if len(self.board.get_empty_points())==0:
+            return DRAW
+        return None
+
 def getMove(p,color):
+    """
+    Return the answer of p to genmove color, or 'timeout',
+    and the seconds it took, or waited for a timeout
+    """
+    start=time.time()
     p.sendline('genmove '+color)
     p.expect([pexpect.TIMEOUT,'= [A-Z][0-9]','= resign','= pass'])
+    seconds=time.time()-start
     if p.after==pexpect.TIMEOUT:
-        return 'timeout'
-    return p.after.decode("utf-8")[2:]
+        return 'timeout',seconds
+    return p.after.decode("utf-8")[2:],seconds
 
 def playMove(p,color,move):
     p.sendline('play '+color+' '+move)
 
-def setupPlayer(p):
+def setupPlayer(p, timelimit):
+    """
+    Start a new game on p and wait until p has answered everything
+    """
     p.sendline('boardsize 7')
     p.sendline('clear_board')
-    p.sendline('timelimit {}'.format(timeout))
-
-def playSingleGame(alternative=False):
-    if not alternative:
-        p1=pexpect.spawn('python3 '+player1,timeout=timeout+1)
-        p2=pexpect.spawn('python3 '+player2,timeout=timeout+1)
-    else:
-        p1=pexpect.spawn('python3 '+player2,timeout=timeout+1)
-        p2=pexpect.spawn('python3 '+player1,timeout=timeout+1)
-    ob=pexpect.spawn('python3 random_player/Gomoku2.py')
-    setupPlayer(p1)
-    setupPlayer(p2)
-    result=None
-    numTimeout=0
-    sw=0
-    while 1:
-        if sw==0:
-            move=getMove(p1,'b')
-            assert(move!='pass')
-            if move=='resign':
-                result=2
-                break
-            elif move=='timeout':
-                result=2
-                break
-            playMove(p2,'b',move)
-            playMove(ob,'b',move)
-        else:
-            move=getMove(p2,'w')
-            assert(move!='pass')
-            if move=='resign':
-                result=1
-                break
-            elif move=='timeout':
-                result=1
-                break
-            playMove(p1,'w',move)
-            playMove(ob,'w',move)
-        sw=1-sw
-        print(move)
-        ob.sendline('gogui-rules_final_result')
-        ob.expect(['= black','= white','= draw','= unknown'])
-        status=ob.after.decode("utf-8")[2:]
-        if status=='black':
-            result=1
+    p.sendline('timelimit {}'.format(timelimit))
+    p.sendline('protocol_version')
+    p.expect('= 2', timeout=SETUP_TIMEOUT)
+
+def startPlayer(path, timelimit, workers):
+    """
+    Start the player at path, with workers playout workers if it has
+    the workers command
+    """
+    # without a time limit a move is waited for as long as it takes
+    wait=timelimit+TIMEOUT_MARGIN if timelimit > 0 else None
+    p=pexpect.spawn(sys.executable, [path], timeout=wait)
+    # the default waits 50ms before every command sent
+    p.delaybeforesend=None
+    p.sendline('known_command workers')
+    if p.expect(['= true', '= false'], timeout=SETUP_TIMEOUT)==0:
+        p.sendline('workers {}'.format(workers))
+    return p
+
+def stopPlayer(p):
+    p.sendline('quit')
+    p.close(force=True)
+
+"""
+Player processes of this tournament worker, by role 'first' or 'second'
+"""
+engines={}
+
+"""
+Shared by the tournament workers, set by initWorker: stopEvent is set
+when the tournament ends, quitBarrier lets each worker take exactly one
+quitPlayers task
+"""
+stopEvent=None
+quitBarrier=None
+
+def initWorker(stop, barrier):
+    global stopEvent, quitBarrier
+    stopEvent,quitBarrier=stop,barrier
+
+def quitPlayers(_):
+    """
+    Task of a tournament worker at the end: send quit to its players,
+    then wait for the other workers, so that none takes two of these
+    """
+    for role in list(engines):
+        dropPlayer(role)
+    try:
+        quitBarrier.wait(timeout=SETUP_TIMEOUT)
+    except threading.BrokenBarrierError:
+        pass
+
+def getPlayer(role, path, timelimit, workers, overhead):
+    """
+    Return the player process for role, set up for a new game: the kept
+    process of role, or a new one with workers playout workers. The
+    seconds taken are added to overhead['start'] or overhead['reset'].
+    """
+    start=time.time()
+    p=engines.get(role)
+    kind='reset'
+    if p is None or not p.isalive():
+        p=startPlayer(path, timelimit, workers)
+        engines[role]=p
+        kind='start'
+    setupPlayer(p, timelimit)
+    overhead[kind].append(time.time()-start)
+    return p
+
+def dropPlayer(role):
+    stopPlayer(engines.pop(role))
+
+def playSingleGame(players):
+    """
+    Play one game between the player processes players['b'] and
+    players['w'], set up for a new game.
+    Returns (result, timedOut, illegal, latency): result is DRAW,
+    BLACK_WIN or WHITE_WIN, or None if the tournament ended first.
+    timedOut and illegal are the color, 'b' or 'w', that ran out of
+    time or played an illegal move, or None.
+    latency has the seconds of each genmove, by color, the last one
+    the seconds waited if it timed out.
+    A player that times out, resigns or plays an illegal move loses.
+    """
+    referee=Referee()
+    result,timedOut,illegal=None,None,None
+    latency={'b': [], 'w': []}
+    color,other='b','w'
+    while result is None:
+        if stopEvent is not None and stopEvent.is_set():
             break
-        elif status=='white':
-            result=2
+        move,seconds=getMove(players[color],color)
+        latency[color].append(seconds)
+        if move=='resign' or move=='timeout':
+            if move=='timeout':
+                timedOut=color
+            result=WHITE_WIN if color=='b' else BLACK_WIN
             break
-        elif status=='draw':
-            result=0
+        try:
+            result=referee.play(color,move)
+        except ValueError:
+            illegal=color
+            result=WHITE_WIN if color=='b' else BLACK_WIN
             break
+        playMove(players[other],color,move)
+        color,other=other,color
+    return result,timedOut,illegal,latency
+
+def playGame(args):
+    """
+    Task of a tournament worker: game number index between the players
+    at paths first and second, first playing black in even numbered games.
+    With fresh the players are started for this game only. Players with
+    the workers command get workers playout workers.
+    Returns (index, firstIsBlack, result, timedOut, illegal, seconds,
+    overhead, latency), where overhead has the lists of seconds taken to
+    start and to reset players, and latency the seconds of the moves of
+    each role. None is returned for a game that was not played to the
+    end, as the tournament ended first.
+    """
+    index,first,second,timelimit,fresh,workers=args
+    if stopEvent is not None and stopEvent.is_set():
+        return None
+    firstIsBlack=(index % 2 == 0)
+    start=time.time()
+    overhead={'start': [], 'reset': []}
+    roles={'first': first, 'second': second}
+    players={role: getPlayer(role, path, timelimit, workers, overhead)
+             for role,path in roles.items()}
+    black,white=('first','second') if firstIsBlack else ('second','first')
+    result,timedOut,illegal,latency=playSingleGame({'b': players[black], 'w': players[white]})
+    if result is None:
+        return None
+    # a player still thinking or out of step would answer the next game late
+    failed={black if color=='b' else white for color in (timedOut, illegal)
+            if color is not None}
+    for role in roles:
+        if fresh or role in failed:
+            dropPlayer(role)
+    latency={black: latency['b'], white: latency['w']}
+    return index,firstIsBlack,result,timedOut,illegal,time.time()-start, \
+           overhead,latency
+
+class TournamentResult(object):
+    """
+    Counts of wins, draws, timeouts and illegal moves of a tournament,
+    from the view of player 1
+    """
+    def __init__(self):
+        self.win1=0
+        self.win2=0
+        self.draw=0
+        self.timeout1=0
+        self.timeout2=0
+        self.illegal1=0
+        self.illegal2=0
+        self.games=0
+        self.decision=None
+        self.startSeconds=[]
+        self.resetSeconds=[]
+        self.latency1=[]
+        self.latency2=[]
+
+    def add(self, firstIsBlack, result, timedOut=None, illegal=None):
+        self.games+=1
+        if result==DRAW:
+            self.draw+=1
+        elif (result==BLACK_WIN)==firstIsBlack:
+            self.win1+=1
         else:
-            assert(status=='unknown')
-    return result,numTimeout
-
-def playGames(numGame=10):
-    global win1,win2,draw,numTimeout
-    for i in range(0,numGame):
-        if(i<numGame/2):
-            alter=False
-        else:
-            alter=True
-        result,timeout=playSingleGame(alternative=alter)
-        if timeout>0:
-            numTimeout+=1
-        else:
-            if result==0:
-                draw+=1
+            self.win2+=1
+        if timedOut is not None:
+            if (timedOut=='b')==firstIsBlack:
+                self.timeout1+=1
             else:
-                if result==1 and alter==False or result==2 and alter==True:
-                    win1+=1
-                else:
-                    assert(result==1 and alter==True or result==2 and alter==False)
-                    win2+=1
+                self.timeout2+=1
+        if illegal is not None:
+            if (illegal=='b')==firstIsBlack:
+                self.illegal1+=1
+            else:
+                self.illegal2+=1
+
+    def addOverhead(self, overhead):
+        self.startSeconds+=overhead['start']
+        self.resetSeconds+=overhead['reset']
+
+    def addLatency(self, latency):
+        self.latency1+=latency['first']
+        self.latency2+=latency['second']
+
+    def overhead(self):
+        """
+        Return (mean seconds to start a player, mean seconds to reset one,
+        seconds saved by resetting players instead of starting them)
+        """
+        meanStart=sum(self.startSeconds) / max(len(self.startSeconds), 1)
+        meanReset=sum(self.resetSeconds) / max(len(self.resetSeconds), 1)
+        saved=len(self.resetSeconds) * (meanStart - meanReset)
+        return meanStart,meanReset,saved
+
+    def score(self):
+        """
+        Score of player 1, a draw counts as half a win
+        """
+        if self.games==0:
+            return 0.0
+        return (self.win1 + 0.5 * self.draw) / self.games
+
+    def scoreStats(self):
+        """
+        Return (games, mean, variance) of the score per game of player 1,
+        from the wins, draws and losses
+        """
+        wins,losses,draws=self.win1,self.win2,self.draw
+        games=wins + losses + draws
+        if games==0:
+            return 0,0.5,0.0
+        mean=(wins + 0.5 * draws) / games
+        variance=(wins * (1 - mean) ** 2 + draws * (0.5 - mean) ** 2
+                  + losses * mean ** 2) / games
+        return games,mean,variance
+
+    def elo(self, z=CONFIDENCE_Z):
+        """
+        Return (elo, low, high): the Elo difference of player 1 over
+        player 2 and its confidence interval. The interval is the Wilson
+        score interval of the mean score, with the variance of the scores
+        for that of a win or loss, so it is not empty when every game had
+        the same score. A score of 0 or 1 is an infinite Elo difference.
+        """
+        games,mean,variance=self.scoreStats()
+        if games==0:
+            return 0.0,-math.inf,math.inf
+        k=z * z / games
+        center=(mean + k / 2) / (1 + k)
+        margin=math.sqrt(k * variance + k * k / 4) / (1 + k)
+        return scoreToElo(mean),scoreToElo(center - margin), \
+               scoreToElo(center + margin)
+
+    def llr(self, elo0, elo1):
+        """
+        Log likelihood ratio of H1: Elo difference elo1, over H0:
+        Elo difference elo0, with the scores per game taken as normal.
+        While all games have the same score their variance is 0, and
+        the variance of a game without draws between the two hypotheses
+        is taken instead.
+        """
+        games,mean,variance=self.scoreStats()
+        score0,score1=eloToScore(elo0),eloToScore(elo1)
+        if variance==0:
+            middle=(score0 + score1) / 2
+            variance=middle * (1 - middle)
+        return games * (score1 - score0) * (2 * mean - score0 - score1) \
+               / (2 * variance)
+
+    def sprt(self, elo0, elo1, alpha, beta):
+        """
+        Return H0, H1 or None while the test goes on, always None before
+        SPRT_MIN_GAMES games
+        """
+        if self.games < SPRT_MIN_GAMES:
+            return None
+        lower,upper=sprtBounds(alpha, beta)
+        llr=self.llr(elo0, elo1)
+        if llr>=upper:
+            return H1
+        if llr<=lower:
+            return H0
+        return None
+
+def percentile(values, q):
+    """
+    Nearest rank q-th percentile of values, 0 if there are none
+    """
+    if not values:
+        return 0.0
+    ordered=sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+def latencyReport(name, seconds, timelimit, timeouts):
+    """
+    Lines reporting the move latencies of a player: percentiles, the
+    margin left against timelimit, the moves over it, and a histogram by
+    fraction of it. seconds has every genmove, the timeouts included
+    with the seconds waited for them, so their true time is longer.
+    """
+    p50,p95,worst=(percentile(seconds, q) for q in (50, 95, 100))
+    lines=['{} moves {} p50 {:.3f}s p95 {:.3f}s max {:.3f}s timeouts {}'.format(
+               name, len(seconds), p50, p95, worst, timeouts)]
+    if timelimit <= 0 or not seconds:
+        return lines
+    overruns=[t - timelimit for t in seconds if t > timelimit]
+    lines.append('{} margin p95 {:+.3f}s max {:+.3f}s'.format(
+        name, timelimit - p95, timelimit - worst))
+    lines.append('{} over the limit {} moves, {:.1%}, mean {:.3f}s max {:.3f}s over'.format(
+        name, len(overruns), len(overruns) / len(seconds),
+        sum(overruns) / max(len(overruns), 1), max(overruns, default=0.0)))
+    counts=[0] * (len(LATENCY_BINS) + 1)
+    for t in seconds:
+        counts[bisect.bisect_left(LATENCY_BINS, t / timelimit)]+=1
+    edges=(0.0,) + LATENCY_BINS
+    for i,count in enumerate(counts):
+        high='{:.0%}'.format(LATENCY_BINS[i]) if i < len(LATENCY_BINS) else ''
+        lines.append('  {:>4.0%}-{:<4} {:6d} {}'.format(
+            edges[i], high, count, '#' * round(50 * count / max(len(seconds), 1))))
+    return lines
+
+def playGames(numGame=10, concurrency=1, first=player1, second=player2,
+              timelimit=timeout, verbose=True, fresh=False, sprt=None):
+    """
+    Play numGame games on concurrency workers, return the
+    TournamentResult and the elapsed seconds.
+    With fresh every game starts new player processes.
+    sprt is None or (elo0, elo1, alpha, beta): stop at the decision of
+    the SPRT, which is stored in results.decision.
+    """
+    results=TournamentResult()
+    workers=max(1, (os.cpu_count() or 1) // concurrency)
+    tasks=[(i, first, second, timelimit, fresh, workers) for i in range(numGame)]
+    start=time.time()
+    stop=multiprocessing.Event()
+    barrier=multiprocessing.Barrier(concurrency)
+    with multiprocessing.Pool(concurrency, initWorker, (stop, barrier)) as pool:
+        for game in pool.imap_unordered(playGame, tasks, chunksize=1):
+            if game is None:
+                continue
+            index,firstIsBlack,result,timedOut,illegal,seconds,overhead,latency=game
+            results.add(firstIsBlack, result, timedOut, illegal)
+            results.addOverhead(overhead)
+            results.addLatency(latency)
+            if verbose:
+                print('game {} player1 {} result {}{}{} {:.1f}s'.format(
+                    index, 'black' if firstIsBlack else 'white',
+                    ('draw', 'black', 'white')[result],
+                    ' timeout '+timedOut if timedOut else '',
+                    ' illegal '+illegal if illegal else '', seconds))
+            if sprt is not None:
+                results.decision=results.sprt(*sprt)
+                if verbose:
+                    print('llr {:.3f} bounds {:.3f} {:.3f}'.format(
+                        results.llr(*sprt[:2]), *sprtBounds(*sprt[2:])))
+                if results.decision is not None:
+                    break
+        # the games not started are skipped, those in progress stop
+        stop.set()
+        pool.map(quitPlayers, range(concurrency), chunksize=1)
+    return results,time.time()-start
+
+def outputResult(results, elapsed, timelimit=timeout):
+    print('player1 win',results.win1,'player2 win',results.win2,'draw',results.draw)
+    print('timeouts player1',results.timeout1,'player2',results.timeout2)
+    print('illegal moves player1',results.illegal1,'player2',results.illegal2)
+    print('player1 score {:.3f}'.format(results.score()))
+    elo,low,high=results.elo()
+    print('player1 elo {:+.1f} ({:+.1f} to {:+.1f})'.format(elo, low, high))
+    if results.decision is not None:
+        print('sprt accepts', results.decision)
+    meanStart,meanReset,saved=results.overhead()
+    print('player starts {} mean {:.3f}s, resets {} mean {:.3f}s, '
+          'saved {:.1f}s'.format(len(results.startSeconds), meanStart,
+                                 len(results.resetSeconds), meanReset, saved))
+    for line in latencyReport('player1', results.latency1, timelimit, results.timeout1) + \
+                latencyReport('player2', results.latency2, timelimit, results.timeout2):
+        print(line)
+    print('{} games in {:.1f}s, {:.2f} games per minute'.format(
+        results.games, elapsed, 60 * results.games / elapsed if elapsed else 0.0))
 
-def outputResult():
-    print('player1 win',win1,'player2 win',win2,'draw',draw)
+def main():
+    parser=argparse.ArgumentParser(description='Tournament between two GTP players')
+    parser.add_argument('-n', '--games', type=int, default=10)
+    parser.add_argument('-j', '--concurrency', type=int, default=os.cpu_count() or 1,
+                        help='games played at the same time')
+    parser.add_argument('-t', '--timelimit', type=float, default=timeout,
+                        help='seconds per move')
+    parser.add_argument('--player1', default=player1)
+    parser.add_argument('--player2', default=player2)
+    parser.add_argument('--fresh', action='store_true',
+                        help='start new player processes for every game')
+    parser.add_argument('--sprt', type=float, nargs=2, metavar=('ELO0', 'ELO1'),
+                        help='stop when player1 is shown ELO1 stronger, or at most ELO0')
+    parser.add_argument('--alpha', type=float, default=0.05,
+                        help='false positive rate of the SPRT')
+    parser.add_argument('--beta', type=float, default=0.05,
+                        help='false negative rate of the SPRT')
+    args=parser.parse_args()
+    sprt=None if args.sprt is None else (*args.sprt, args.alpha, args.beta)
+    results,elapsed=playGames(args.games, args.concurrency, args.player1,
+                              args.player2, args.timelimit, fresh=args.fresh,
+                              sprt=sprt)
+    outputResult(results, elapsed, args.timelimit)
 
-playGames(1)
-outputResult()
+if __name__=='__main__':
+    main()
@@ -363,7 +363,7 @@ class SimpleGoBoard(object):
             p = p + d
             if self.board[p] == color:
                 count = count + 1
-                if count == 5:
+                if count >= 5:
                     break
             else:
                 break
@@ -373,12 +373,12 @@ class SimpleGoBoard(object):
             p = p + d
             if self.board[p] == color:
                 count = count + 1
-                if count == 5:
+                if count >= 5:
                     break
             else:
                 break
-        assert count <= 5
-        return count == 5
+        # an overline of six or more also wins
+        return count >= 5
     
     def point_check_game_end_gomoku(self, point):
         """
@@ -0,0 +1,34 @@
+"""
+players.py
+Imports of the modules of one player directory in the tests.
+
+Each player directory is a flat set of modules, and the players share
+module names such as simple_board and board_util. use_player puts the
+directory of a player first on the path and forgets the modules already
+imported from the other players, so a test module gets the modules of
+its own player. The modules it imported stay bound in it.
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PLAYERS = ('gomoku4', 'flat_mc_player', 'random_player')
+
+def player_dir(name):
+    return os.path.join(ROOT, name)
+
+def use_player(name):
+    """
+    Make the modules of player name the ones found by import
+    """
+    directory = player_dir(name)
+    others = [player_dir(player) for player in PLAYERS if player != name]
+    for module_name, module in list(sys.modules.items()):
+        path = getattr(module, '__file__', None)
+        if path and os.path.dirname(os.path.abspath(path)) in others:
+            del sys.modules[module_name]
+    if directory in sys.path:
+        sys.path.remove(directory)
+    sys.path.insert(0, directory)
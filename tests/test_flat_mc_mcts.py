@@ -0,0 +1,70 @@
+"""
+Tests of the reuse of the search tree by the MCTSPlayer of
+flat_mc_player.
+"""
+
+import random
+
+import numpy as np
+
+from players import use_player
+use_player('flat_mc_player')
+
+from Gomoku3 import MCTSPlayer
+from simple_board import SimpleGoBoard
+
+def new_player(seed):
+    random.seed(seed)
+    np.random.seed(seed)
+    player = MCTSPlayer()
+    player.n_simualtions_per_move = 2
+    return player
+
+def root_moves(player):
+    tree = player.tree
+    return {int(tree.move[c]) for c in tree.children(0)}
+
+def test_new_board_size_gets_new_tree():
+    """
+    After boardsize the tree of the old board, with the same empty
+    history, is not reused
+    """
+    player = new_player(1)
+    board = SimpleGoBoard(7)
+    player.get_move(board, board.current_player)
+    board.reset(9)
+    move = player.get_move(board, board.current_player)
+    assert board.moves == []
+    assert move in board.get_empty_points()
+    assert root_moves(player) == set(board.get_empty_points())
+
+def test_tree_follows_game():
+    """
+    The subtree of the moves played since the last search is kept
+    """
+    player = new_player(2)
+    board = SimpleGoBoard(7)
+    move = player.get_move(board, board.current_player)
+    tree = player.tree
+    child = tree.find_child(0, move)
+    reply = int(tree.move[tree.best_child(child)])
+    grandchild = tree.find_child(child, reply)
+    visits = int(tree.visits[grandchild])
+    assert visits > 0
+    board.play_move_gomoku(move, board.current_player)
+    board.play_move_gomoku(reply, board.current_player)
+    subtree = player._reuse_tree(board)
+    assert subtree.visits[0] == visits
+    assert {int(subtree.move[c]) for c in subtree.children(0)} <= \
+        set(board.get_empty_points())
+
+def test_other_game_gets_new_tree():
+    player = new_player(3)
+    board = SimpleGoBoard(7)
+    move = player.get_move(board, board.current_player)
+    board.play_move_gomoku(move, board.current_player)
+    player.get_move(board, board.current_player)
+    board.reset(7)
+    other = [p for p in board.get_empty_points() if p != move][0]
+    board.play_move_gomoku(other, board.current_player)
+    assert player._reuse_tree(board).size == 1
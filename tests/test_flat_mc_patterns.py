@@ -0,0 +1,141 @@
+"""
+Differential tests of the bitboard pattern moves of the flat_mc_player
+SimpleGoBoard.
+
+get_pattern_moves and list_solve_point are compared with the recursive
+string-based check_pattern they replaced, on random positions and after
+moves are taken back. The modules flat_mc_player shares with gomoku4
+are copies, checked to be the same.
+"""
+
+import filecmp
+import os
+import random
+
+from players import use_player, player_dir
+use_player('flat_mc_player')
+
+from board_util import EMPTY, BORDER
+from simple_board import SimpleGoBoard
+
+"""
+The pattern categories of the old check_pattern: win, block win, make
+four and block open three
+"""
+OLD_PATTERNS = [{'xxxx.':{0},'xxx.x':{1},'xx.xx':{2},'x.xxx':{3},'.xxxx':{4}},
+                {'oooo.':{0},'ooo.o':{1},'oo.oo':{2},'o.ooo':{3},'.oooo':{4}},
+                {'.xxx..':{1},'..xxx.':{4},'.xx.x.':{2},'.x.xx.':{3}},
+                {'.ooo..':{1,5},'..ooo.':{0,4},'.oo.o.':{0,2,5},'.o.oo.':{0,3,5},
+                 'B.ooo..':{0}, '..ooo.B':{6}, 'x.ooo..':{0}, '..ooo.x':{6}}]
+OLD_SOLVE_PATTERNS = OLD_PATTERNS[:3] + \
+    [{'.ooo..':{1,5},'..ooo.':{0,4},'.oo.o.':{2},'.o.oo.':{3}}]
+
+"""
+Modules that are the same in gomoku4 and flat_mc_player
+"""
+SHARED_MODULES = ('line_tables.py', 'deadline.py')
+
+def old_check_pattern(board, point, have, direction_x, direction_y,
+                      move_sets, patterns, color):
+    """
+    The old SimpleGoBoard.check_pattern, without its unused flag
+    """
+    for i in range(0, 4):
+        if have in patterns[i]:
+            for dis in patterns[i][have]:
+                move_sets[i].add(point - direction_x * (dis + 1)
+                                 - direction_y * board.NS * (dis + 1))
+            break
+    if (not (0 <= point < len(board.board))) or len(have) == 9:
+        return
+    piece = board.get_color(point)
+    if piece == EMPTY:
+        piece = '.'
+    elif piece == color:
+        piece = 'x'
+    elif piece == BORDER:
+        piece = 'B'
+    else:
+        piece = 'o'
+    have += piece
+    old_check_pattern(board, point + direction_x + direction_y * board.NS,
+                      have, direction_x, direction_y, move_sets, patterns,
+                      color)
+
+def old_pattern_moves(board, patterns, starts):
+    """
+    The first category of patterns with moves as (index, moves), found
+    from each point of starts as the old get_pattern_moves and
+    list_solve_point did, or None
+    """
+    move_sets = [set(), set(), set(), set()]
+    color = board.current_player
+    for point in starts:
+        for direction_x, direction_y in ((1, 0), (0, 1), (1, 1), (-1, 1)):
+            old_check_pattern(board, point, '', direction_x, direction_y,
+                              move_sets, patterns, color)
+    for i, moves in enumerate(move_sets):
+        if moves:
+            return i, moves
+    return None
+
+def check_patterns(board):
+    expected = old_pattern_moves(board, OLD_PATTERNS, range(len(board.board)))
+    patterns = board.get_pattern_moves()
+    if expected is None:
+        assert patterns is None
+    else:
+        assert (patterns[0], set(patterns[1])) == expected
+    on_board = [p for p in range(len(board.board)) if board.board[p] != BORDER]
+    expected = old_pattern_moves(board, OLD_SOLVE_PATTERNS, on_board)
+    solve_points = board.list_solve_point()
+    if expected is None:
+        assert solve_points is None
+    else:
+        assert set(solve_points) == expected[1]
+
+def random_position(size, stones, rng):
+    """
+    A board of size with stones played in turn at random points,
+    without a five in a row
+    """
+    board = SimpleGoBoard(size)
+    points = board.get_empty_points()
+    rng.shuffle(points)
+    for point in points:
+        if len(board.moves) == stones:
+            break
+        board.play_move_gomoku(point, board.current_player)
+        if board.check_game_end_gomoku()[0]:
+            board.undo_move()
+    return board
+
+def test_pattern_moves_7x7():
+    rng = random.Random(7)
+    for stones in range(0, 45, 2):
+        for _ in range(20):
+            check_patterns(random_position(7, stones, rng))
+
+def test_pattern_moves_large_boards():
+    rng = random.Random(11)
+    for size in (11, 15, 19):
+        for fill in (0.1, 0.25, 0.4):
+            for _ in range(3):
+                check_patterns(random_position(size, round(fill * size * size), rng))
+
+def test_pattern_moves_after_undo():
+    """
+    The bitboards of the stones are restored by undo_move
+    """
+    rng = random.Random(3)
+    for _ in range(20):
+        board = random_position(7, 30, rng)
+        for _ in range(rng.randint(1, 20)):
+            board.undo_move()
+            check_patterns(board)
+
+def test_shared_modules_match():
+    for name in SHARED_MODULES:
+        assert filecmp.cmp(os.path.join(player_dir('gomoku4'), name),
+                           os.path.join(player_dir('flat_mc_player'), name),
+                           shallow=False), name
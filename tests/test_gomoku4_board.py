@@ -0,0 +1,202 @@
+"""
+Differential tests of the incremental state of the gomoku4 SimpleGoBoard.
+
+Random games are played and partly taken back. After every move and
+every undo the winner, the hash, the window counts and threat buckets,
+the line codes and the pattern moves of the board are compared with
+the same values computed from scratch from the stones on the board.
+"""
+
+import random
+
+from players import use_player
+use_player('gomoku4')
+
+from board_util import GoBoardUtil, BLACK, WHITE, EMPTY, BORDER
+from simple_board import SimpleGoBoard, ZOBRIST_STONE, ZOBRIST_WHITE_TO_PLAY
+
+"""
+Board sizes, from 15x15 on the lines are longer than 15 points, so the
+line codes do not fit in 32 bits
+"""
+SIZES = (7, 11, 15, 19)
+
+"""
+The pattern categories of the string-based check_pattern that
+get_pattern_moves and list_solve_point replaced: win, block win,
+make four and block open three
+"""
+OLD_PATTERNS = [{'xxxx.':{0},'xxx.x':{1},'xx.xx':{2},'x.xxx':{3},'.xxxx':{4}},
+                {'oooo.':{0},'ooo.o':{1},'oo.oo':{2},'o.ooo':{3},'.oooo':{4}},
+                {'.xxx..':{1},'..xxx.':{4},'.xx.x.':{2},'.x.xx.':{3}},
+                {'.ooo..':{1,5},'..ooo.':{0,4},'.oo.o.':{0,2,5},'.o.oo.':{0,3,5},
+                 'B.ooo..':{0}, '..ooo.B':{6}, 'x.ooo..':{0}, '..ooo.x':{6}}]
+OLD_SOLVE_PATTERNS = OLD_PATTERNS[:3] + \
+    [{'.ooo..':{1,5},'..ooo.':{0,4},'.oo.o.':{2},'.o.oo.':{3}}]
+
+def old_pattern_moves(board, patterns, starts):
+    """
+    The move sets of each category of patterns, as found by the old
+    check_pattern from each point of starts in the four directions
+    """
+    color = board.current_player
+    move_sets = [set() for _ in patterns]
+    for point in starts:
+        for step in (1, board.NS, board.NS + 1, board.NS - 1):
+            have = ''
+            p = point
+            while True:
+                for i, category in enumerate(patterns):
+                    if have in category:
+                        for dis in category[have]:
+                            move_sets[i].add(p - step * (dis + 1))
+                        break
+                if not 0 <= p < len(board.board) or len(have) == 9:
+                    break
+                piece = board.board[p]
+                if piece == EMPTY:
+                    have += '.'
+                elif piece == color:
+                    have += 'x'
+                elif piece == BORDER:
+                    have += 'B'
+                else:
+                    have += 'o'
+                p += step
+    return move_sets
+
+def first_category(move_sets):
+    for i, moves in enumerate(move_sets):
+        if moves:
+            return i, moves
+    return None
+
+def check_board(board, stones):
+    """
+    Compare the state of board with the state computed from stones,
+    a dict from point to color
+    """
+    t = board.line_tables
+    for row in range(1, board.size + 1):
+        for col in range(1, board.size + 1):
+            point = board.pt(row, col)
+            assert board.board[point] == stones.get(point, EMPTY)
+    empty = [p for p in range(board.maxpoint) if board.board[p] == EMPTY]
+    assert sorted(board.get_empty_points()) == empty
+    assert board.num_empty_points() == len(empty)
+    assert board.current_player == (BLACK if len(stones) % 2 == 0 else WHITE)
+
+    stone_hash = 0
+    for point, color in stones.items():
+        stone_hash ^= ZOBRIST_STONE[color][point]
+    if board.current_player == WHITE:
+        stone_hash ^= ZOBRIST_WHITE_TO_PLAY
+    assert board.hash == stone_hash
+
+    winner = None
+    for color in (BLACK, WHITE):
+        opp = GoBoardUtil.opponent(color)
+        count5 = [sum(stones.get(p) == color for p in w) for w in t.windows5]
+        count6 = [sum(stones.get(p) == color for p in w) for w in t.windows6]
+        theirs5 = [sum(stones.get(p) == opp for p in w) for w in t.windows5]
+        theirs6 = [sum(stones.get(p) == opp for p in w) for w in t.windows6]
+        assert board._count5[color] == count5
+        assert board._count6[color] == count6
+        assert board._fours[color] == {w for w, n in enumerate(count5)
+                                       if n == 4 and theirs5[w] == 0}
+        assert board._threes[color] == {w for w, n in enumerate(count6)
+                                        if n == 3 and theirs6[w] == 0}
+        if 5 in count5:
+            winner = color
+    assert board.check_game_end_gomoku() == (winner is not None, winner)
+
+    for line, points in enumerate(t.padded_lines):
+        code = BORDER | BORDER << (2 * (len(points) - 1))
+        for i, point in enumerate(points[1:-1]):
+            code |= stones.get(point, EMPTY) << (2 * i + 2)
+        assert board._line_codes[line] == code
+
+    on_board = [p for p in range(board.maxpoint) if board.board[p] != BORDER]
+    expected = first_category(old_pattern_moves(
+        board, OLD_PATTERNS, range(board.maxpoint)))
+    patterns = board.get_pattern_moves()
+    if expected is None:
+        assert patterns is None
+    else:
+        assert (patterns[0], set(patterns[1])) == expected
+    expected = first_category(old_pattern_moves(
+        board, OLD_SOLVE_PATTERNS, on_board))
+    solve_points = board.list_solve_point()
+    if expected is None:
+        assert solve_points is None
+    else:
+        assert set(solve_points) == expected[1]
+
+    scanned, wins = board.scan_patterns()
+    if patterns is None:
+        assert scanned is None
+    else:
+        assert scanned == (patterns[0], sorted(set(patterns[1])))
+    detected = board.winDetection()
+    if detected[0]:
+        assert set(detected[0]) <= set(wins[0])
+        assert wins[1:] == ([], [], [])
+    else:
+        assert wins == tuple(sorted(set(moves)) for moves in detected)
+
+def play_random_game(size, seed, steps):
+    """
+    Play and take back random moves for steps steps on a board of size,
+    checking the board after each step. A move is taken back with
+    probability 1/3, and always once the game is over.
+    """
+    rng = random.Random(seed)
+    board = SimpleGoBoard(size)
+    stones = {}
+    history = []
+    check_board(board, stones)
+    for _ in range(steps):
+        game_over = board.check_game_end_gomoku()[0] or \
+                    board.num_empty_points() == 0
+        if history and (game_over or rng.random() < 1 / 3):
+            point = history.pop()
+            assert board.undo_move() == point
+            del stones[point]
+        else:
+            point = rng.choice(board.get_empty_points())
+            color = board.current_player
+            assert board.play_move_gomoku(point, color)
+            stones[point] = color
+            history.append(point)
+        check_board(board, stones)
+
+def test_incremental_state_7x7():
+    for seed in range(4):
+        play_random_game(7, seed, 120)
+
+def test_incremental_state_large_boards():
+    for size in SIZES[1:]:
+        play_random_game(size, size, 80)
+
+def test_crowded_positions():
+    """
+    Threats are most frequent with many stones on the board
+    """
+    for seed in range(10):
+        play_random_game(7, 100 + seed, 60)
+
+def test_copy_keeps_state():
+    rng = random.Random(1)
+    board = SimpleGoBoard(11)
+    stones = {}
+    for _ in range(30):
+        point = rng.choice(board.get_empty_points())
+        stones[point] = board.current_player
+        board.play_move_gomoku(point, board.current_player)
+        if board.check_game_end_gomoku()[0]:
+            break
+    copy = board.copy()
+    check_board(copy, stones)
+    point = rng.choice(copy.get_empty_points())
+    copy.play_move_gomoku(point, copy.current_player)
+    check_board(board, stones)
@@ -0,0 +1,99 @@
+"""
+Tests of the gomoku4 alphabeta search with its transposition table.
+
+iterative_deepening is run on the positions of positions.txt with the
+table, and again with a table that never finds an entry. The scores
+must be the same. The moves may differ between moves of the same
+score, as the table changes the order they are searched in, so the
+move found with the table is searched again without it.
+"""
+
+import os
+
+import pytest
+
+from players import use_player, ROOT
+use_player('gomoku4')
+
+import alphabeta
+from board_util import coord_to_point
+from gtp_connection import move_to_coord
+from simple_board import SimpleGoBoard
+from transposition import TranspositionTable
+
+POSITIONS = os.path.join(ROOT, 'positions.txt')
+
+"""
+Largest depth of the iterative deepening in the tests
+"""
+DEPTH = 2
+
+class NoTable(TranspositionTable):
+    """
+    A transposition table that stores nothing
+    """
+    def probe(self, key):
+        self.probes += 1
+        return None
+
+    def store(self, key, depth, flag, score, move):
+        self.stores += 1
+
+def load_positions():
+    """
+    Boards of the positions of positions.txt by name, see
+    bench_search.loadPositions
+    """
+    positions = {}
+    with open(POSITIONS) as f:
+        for line in f:
+            fields = line.split()
+            if not fields or fields[0].startswith('#'):
+                continue
+            size = int(fields[1])
+            board = SimpleGoBoard(size)
+            for move in fields[2:]:
+                row, col = move_to_coord(move, size)
+                board.play_move_gomoku(coord_to_point(row, col, size),
+                                       board.current_player)
+            positions[fields[0]] = board
+    return positions
+
+def search(board, table):
+    alphabeta.tt = table
+    alphabeta.reset_search_state()
+    return alphabeta.iterative_deepening(board, None, DEPTH)
+
+@pytest.fixture
+def restore_table():
+    table = alphabeta.tt
+    yield
+    alphabeta.tt = table
+    alphabeta.reset_search_state()
+
+@pytest.mark.parametrize('name', list(load_positions()))
+def test_table_keeps_result(name, restore_table):
+    board = load_positions()[name]
+    score, move, proven = search(board, TranspositionTable())
+    depth = alphabeta.depth
+    plain_score, plain_move, plain_proven = search(board, NoTable())
+    assert (score, proven) == (plain_score, plain_proven)
+    assert alphabeta.depth == depth
+    if move != plain_move:
+        # the same search as search_root does for move at the last depth
+        board.play_move_gomoku(move, board.current_player)
+        assert -alphabeta.alphabeta(board, -alphabeta.INFINITY,
+                                    alphabeta.INFINITY, depth) == score
+        board.undo_move()
+
+def test_table_entries_are_used(restore_table):
+    """
+    The table is probed and cuts off part of the search
+    """
+    board = load_positions()['midgame-10']
+    table = TranspositionTable()
+    search(board, table)
+    with_table = alphabeta.nodes
+    assert table.cutoffs > 0
+    search(board, NoTable())
+    assert alphabeta.nodes > with_table
@@ -0,0 +1,88 @@
+"""
+Known values of the Elo estimate and the SPRT of the tournament results
+of play.py.
+"""
+
+import math
+import sys
+
+import pytest
+
+from players import use_player, ROOT
+use_player('random_player')
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+
+from play import TournamentResult, BLACK_WIN, WHITE_WIN, DRAW, H0, H1, \
+                 SPRT_MIN_GAMES, sprtBounds
+
+def results(wins, draws, losses):
+    """
+    TournamentResult of player 1 with wins, draws and losses, playing
+    black and white in turn
+    """
+    r = TournamentResult()
+    for i in range(wins):
+        r.add(i % 2 == 0, BLACK_WIN if i % 2 == 0 else WHITE_WIN)
+    for i in range(draws):
+        r.add(i % 2 == 0, DRAW)
+    for i in range(losses):
+        r.add(i % 2 == 0, WHITE_WIN if i % 2 == 0 else BLACK_WIN)
+    return r
+
+def test_score_stats():
+    games, mean, variance = results(60, 10, 30).scoreStats()
+    assert games == 100
+    assert mean == pytest.approx(0.65)
+    assert variance == pytest.approx(0.2025)
+
+def test_elo_known_value():
+    """
+    A score of 0.65, 400 log10(0.65 / 0.35), and the Wilson interval of
+    100 games with the variance 0.2025
+    """
+    elo, low, high = results(60, 10, 30).elo()
+    assert elo == pytest.approx(107.538, abs=1e-3)
+    assert low == pytest.approx(40.149, abs=1e-3)
+    assert high == pytest.approx(174.001, abs=1e-3)
+
+def test_elo_even_score():
+    elo, low, high = results(10, 5, 10).elo()
+    assert elo == pytest.approx(0.0)
+    assert low == pytest.approx(-high)
+    assert low < 0
+
+def test_elo_all_wins():
+    """
+    The estimate is infinite, the interval is not empty
+    """
+    elo, low, high = results(20, 0, 0).elo()
+    assert elo == math.inf
+    assert 0 < low < 1000
+    # a score of 1, up to rounding
+    assert high > 1000
+
+def test_llr_known_value():
+    r = results(60, 10, 30)
+    assert r.llr(0, 10) == pytest.approx(1.0146, abs=1e-4)
+    assert r.llr(-20, 20) == pytest.approx(4.2593, abs=1e-4)
+    assert r.llr(10, 0) == pytest.approx(-r.llr(0, 10))
+
+def test_sprt_decisions():
+    lower, upper = sprtBounds(0.05, 0.05)
+    assert (lower, upper) == pytest.approx((-2.9444, 2.9444), abs=1e-4)
+    assert results(60, 10, 30).sprt(0, 10, 0.05, 0.05) is None
+    assert results(60, 10, 30).sprt(-20, 20, 0.05, 0.05) == H1
+    assert results(30, 10, 60).sprt(-20, 20, 0.05, 0.05) == H0
+
+def test_sprt_waits_for_min_games():
+    """
+    Before SPRT_MIN_GAMES games there is no decision, even past a bound.
+    With only wins the variance is that of a game between the two
+    hypotheses.
+    """
+    r = results(SPRT_MIN_GAMES - 5, 0, 0)
+    assert r.llr(0, 100) > sprtBounds(0.05, 0.05)[1]
+    assert r.sprt(0, 100, 0.05, 0.05) is None
+    r = results(SPRT_MIN_GAMES, 0, 0)
+    assert r.sprt(0, 100, 0.05, 0.05) == H1